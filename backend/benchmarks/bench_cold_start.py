@@ -0,0 +1,120 @@
+"""Cold-start benchmark: how long a fresh process takes to import the app and serve its first work.
+
+Every run starts a new interpreter that imports main, answers GET / through the test client,
+then (after --idle seconds, as a real server would sit before its first upload) extracts a
+synthetic W-2 and fills a 1040. Runs are repeated with the startup prewarm thread off and on.
+
+Run from the backend directory:
+    python benchmarks/bench_cold_start.py [--runs N] [--idle SECONDS] [--output results.json]
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executed in the fresh interpreter; prints one JSON object of timings in milliseconds
+CHILD = r"""
+import sys, json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+import extraction
+main.app.test_client().get('/')
+first_request = time.perf_counter()
+time.sleep(float(sys.argv[2]))
+with open(sys.argv[1], 'rb') as f:
+    pdf_bytes = f.read()
+t0 = time.perf_counter()
+extraction.parse_tax_document(extraction.extract_text_from_pdf(pdf_bytes))
+t1 = time.perf_counter()
+main.fill_1040_form(50000, 0, 0, 5000, 50000, 4000, 4000, 1000, 'single', 0, 0)
+t2 = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_request_ms': (first_request - imported) * 1000,
+    'first_extract_ms': (t1 - t0) * 1000,
+    'first_fill_ms': (t2 - t1) * 1000
+}))
+"""
+
+
+def make_w2_pdf(path: str):
+    import fitz
+    doc = fitz.open()
+    page = doc.new_page()
+    lines = [
+        ["Form W-2 Wage and Tax Statement 2024"],
+        ["b Employer identification number", "1 Wages, tips, other comp", "2 Federal income tax withheld"],
+        ["12-3456789", "52000.00", "6100.00"]
+    ]
+    for row, cells in enumerate(lines):
+        for column, cell in enumerate(cells):
+            page.insert_text((72 + column * 160, 72 + row * 20), cell, fontsize=10)
+    doc.save(path)
+
+
+def run_once(pdf_path: str, prewarm: bool, idle: float) -> dict:
+    env = dict(os.environ, PREWARM='1' if prewarm else '0')
+    output = subprocess.check_output([sys.executable, '-c', CHILD, pdf_path, str(idle)],
+                                     cwd=BACKEND_DIR, env=env, text=True)
+    # The app prints while handling documents; the timings are the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(samples):
+    summary = {}
+    for key in samples[0]:
+        values = sorted(sample[key] for sample in samples)
+        summary[key] = {
+            'p50': round(percentile(values, 50), 2),
+            'min': round(values[0], 2),
+            'max': round(values[-1], 2)
+        }
+    return summary
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help="Fresh processes started per configuration")
+    parser.add_argument('--idle', type=float, default=1.0, help="Seconds between startup and the first upload")
+    parser.add_argument('--output', '-o', help="Write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench_cold_start_') as workdir:
+        pdf_path = os.path.join(workdir, 'w2.pdf')
+        make_w2_pdf(pdf_path)
+        results = {
+            'meta': {'commit': git_commit(), 'python': sys.version.split()[0], 'runs': args.runs, 'idle_seconds': args.idle},
+            'configurations': {
+                name: summarize([run_once(pdf_path, prewarm, args.idle) for _ in range(args.runs)])
+                for name, prewarm in (('no_prewarm', False), ('prewarm', True))
+            }
+        }
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
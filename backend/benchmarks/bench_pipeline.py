@@ -0,0 +1,280 @@
+"""Benchmark of the upload -> extract -> calculate -> fill pipeline on synthetic documents.
+
+Generates text-layer and scanned W-2 / 1099-NEC / 1099-INT PDFs locally (no network) and
+times every stage: text extraction, OCR, the three parsers, the tax calculation and the
+1040 fill. Each stage reports throughput, p50/p95/p99 latency and the peak RSS reached.
+OCR stages are skipped when tesseract is not installed.
+
+Run from the backend directory:
+    python benchmarks/bench_pipeline.py [--iterations N] [--output results.json]
+    python benchmarks/bench_pipeline.py --compare baseline.json --output current.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import shutil
+import resource
+import tempfile
+import subprocess
+import contextlib
+import dataclasses
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz
+import pytesseract
+
+import main
+from extraction import EXTRACTION_MODE, extract_text_from_pdf, extract_text_with_ocr
+from ocr_engine import LEGACY_OCR_SETTINGS, ocr_engine, open_pdf, ocr_page, render_for_ocr
+from tax_logic import FILING_STATUSES, calculate_total_tax
+
+# Line layouts the parsers in main.py expect, one list of cells per text line
+DOCUMENT_LAYOUTS = {
+    'w2': lambda a, b: [
+        ["Form W-2 Wage and Tax Statement 2024"],
+        ["b Employer identification number", "1 Wages, tips, other comp", "2 Federal income tax withheld"],
+        ["12-3456789", f"{a:.2f}", f"{b:.2f}"],
+        ["c Employer's name, address, and ZIP code"]
+    ],
+    'nec': lambda a, b: [
+        ["Form 1099-NEC Nonemployee Compensation 2024"],
+        ["PAYER'S TIN RECIPIENT'S TIN Copy B For Recipient"],
+        ["12-3456789", "123-45-6789", "$", f"{a:.2f}"]
+    ],
+    'int': lambda a, b: [
+        ["Form 1099-INT Interest Income 2024"],
+        ["PAYER'S TIN", "RECIPIENT'S TIN", "1 Interest income"],
+        [f"12-3456789 123-45-6789 $ {a:.2f} 2024"],
+        ["2 Early withdrawal penalty"]
+    ]
+}
+
+PARSERS = {
+    'w2': main.extract_w2_values,
+    'nec': main.extract_NEC,
+    'int': main.extract_INT
+}
+
+
+def make_text_pdf(kind: str, rng: random.Random) -> bytes:
+    doc = fitz.open()
+    page = doc.new_page()
+    y = 72
+    for cells in DOCUMENT_LAYOUTS[kind](rng.uniform(1000, 150000), rng.uniform(100, 20000)):
+        for column, cell in enumerate(cells):
+            page.insert_text((72 + column * 160, y), cell, fontsize=10)
+        y += 20
+    return doc.tobytes()
+
+
+def make_scanned_pdf(text_pdf: bytes, dpi: int = 150) -> bytes:
+    # Rasterize the text-layer version so the only way to read it back is OCR
+    source = fitz.open(stream=text_pdf, filetype="pdf")
+    pix = source[0].get_pixmap(dpi=dpi)
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_image(page.rect, pixmap=pix)
+    return doc.tobytes()
+
+
+def render_first_page(path, settings):
+    with open_pdf(path) as doc:
+        image, _, _ = render_for_ocr(doc[0], settings)
+        return image
+
+
+def ocr_first_page(path, settings):
+    with open_pdf(path) as doc:
+        return ocr_page(doc[0], settings)
+
+
+def tesseract_available() -> bool:
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except (pytesseract.TesseractNotFoundError, OSError):
+        return False
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux; OCR pool processes are accounted as children
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / 1024, 1)
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+def run_stage(func, inputs, iterations: int):
+    """Call func(*args) for every input, iterations times; the parsers' debug prints are discarded."""
+    latencies = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        func(*inputs[0])  # Warm-up, not timed
+        start = time.perf_counter()
+        for i in range(iterations):
+            args = inputs[i % len(inputs)]
+            t0 = time.perf_counter()
+            func(*args)
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'calls': iterations,
+        'throughput_per_second': round(iterations / elapsed, 2),
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies) * 1000, 4),
+            'p50': round(percentile(latencies, 50) * 1000, 4),
+            'p95': round(percentile(latencies, 95) * 1000, 4),
+            'p99': round(percentile(latencies, 99) * 1000, 4)
+        },
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    ocr = tesseract_available() and not args.skip_ocr
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    try:
+        return _run_stages(args, rng, ocr, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _run_stages(args, rng, ocr, workdir):
+    text_paths, scanned_paths = {}, {}
+    for kind in DOCUMENT_LAYOUTS:
+        for variant in range(args.documents):
+            data = make_text_pdf(kind, rng)
+            path = os.path.join(workdir, f"{kind}_{variant}.pdf")
+            with open(path, 'wb') as f:
+                f.write(data)
+            text_paths.setdefault(kind, []).append((path,))
+            path = os.path.join(workdir, f"{kind}_{variant}_scan.pdf")
+            with open(path, 'wb') as f:
+                f.write(make_scanned_pdf(data))
+            scanned_paths.setdefault(kind, []).append((path,))
+
+    stages = {}
+    all_text_paths = [path for paths in text_paths.values() for path in paths]
+    stages['extract_text_from_pdf'] = run_stage(extract_text_from_pdf, all_text_paths, args.iterations)
+
+    # Page preprocessing with the original full-page 72 dpi render vs. adaptive dpi, crop to the
+    # inked area and binarization; pixels are what Tesseract has to read
+    all_scanned_paths = [path for paths in scanned_paths.values() for path in paths]
+    ocr_iterations = max(1, args.iterations // 10)
+    adaptive = dataclasses.replace(ocr_engine.settings, adaptive_dpi=True, crop=True, binarize=True)
+    for label, settings in (('legacy', LEGACY_OCR_SETTINGS), ('adaptive', adaptive)):
+        stage = run_stage(lambda path, settings=settings: render_first_page(path, settings),
+                          all_scanned_paths, args.iterations)
+        images = [render_first_page(path, settings) for (path,) in all_scanned_paths]
+        stage['pixels_per_page'] = sum(image.width * image.height for image in images if image) // len(images)
+        stages[f'ocr_preprocess_{label}'] = stage
+        if ocr:
+            stages[f'ocr_page_{label}'] = run_stage(lambda path, settings=settings: ocr_first_page(path, settings),
+                                                    all_scanned_paths, ocr_iterations)
+
+    if ocr:
+        stages['extract_text_with_ocr'] = run_stage(extract_text_with_ocr, all_scanned_paths, ocr_iterations)
+        stages['extract_text_from_pdf_scanned'] = run_stage(extract_text_from_pdf, all_scanned_paths, ocr_iterations)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        texts = {kind: [(extract_text_from_pdf(path),) for (path,) in paths]
+                 for kind, paths in text_paths.items()}
+    for kind, parser in PARSERS.items():
+        stages[f'parse_{kind}'] = run_stage(parser, texts[kind], args.iterations * 10)
+
+    returns = []
+    for _ in range(256):
+        returns.append((rng.choice([rng.uniform(0, 120000), rng.uniform(0, 600000)]),
+                        rng.choice(FILING_STATUSES), rng.randint(0, 3), rng.randint(0, 2)))
+    stages['calculate_total_tax'] = run_stage(calculate_total_tax, returns, args.iterations * 10)
+
+    fills = []
+    for income, status, children, others in returns[:32]:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            tax_no_credits, tax_owed, _ = calculate_total_tax(income, status, children, others)
+        withheld = income * 0.12
+        fills.append((income * 0.8, income * 0.15, income * 0.05, withheld, income,
+                      tax_no_credits, tax_owed, withheld - tax_owed, status, children, others))
+    stages['fill_1040_form'] = run_stage(main.fill_1040_form, fills, max(1, args.iterations // 2))
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'extraction_mode': EXTRACTION_MODE,
+            'ocr_workers': ocr_engine.workers,
+            'ocr_settings': dataclasses.asdict(ocr_engine.settings),
+            'ocr_available': ocr,
+            'iterations': args.iterations,
+            'documents_per_type': args.documents,
+            'seed': args.seed
+        },
+        'stages': stages
+    }
+
+
+def compare(baseline, current):
+    """Print p50 latency and throughput of every stage relative to a baseline run."""
+    print(f"{'stage':<32}{'p50 ms':>12}{'baseline':>12}{'change':>10}")
+    for stage, result in current['stages'].items():
+        before = baseline.get('stages', {}).get(stage)
+        p50 = result['latency_ms']['p50']
+        if before is None:
+            print(f"{stage:<32}{p50:>12.3f}{'-':>12}{'new':>10}")
+            continue
+        base_p50 = before['latency_ms']['p50']
+        change = (p50 - base_p50) / base_p50 * 100 if base_p50 else 0.0
+        print(f"{stage:<32}{p50:>12.3f}{base_p50:>12.3f}{change:>+9.1f}%")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200, help="Timed calls per extraction stage")
+    parser.add_argument('--documents', type=int, default=4, help="Synthetic documents generated per form type")
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--skip-ocr', action='store_true')
+    parser.add_argument('--output', '-o', help="Write the JSON results here instead of stdout")
+    parser.add_argument('--compare', help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    results = run(args)
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+    if not results['meta']['ocr_available']:
+        print("OCR stages skipped (tesseract not installed or --skip-ocr)", file=sys.stderr)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        with contextlib.redirect_stdout(sys.stderr if not args.output else sys.stdout):
+            compare(baseline, results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
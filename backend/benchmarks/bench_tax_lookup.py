@@ -0,0 +1,58 @@
+"""Microbenchmark: compiled bracket lookup vs. the original linear bracket loop.
+
+Run from the backend directory:
+    python benchmarks/bench_tax_lookup.py [--records N] [--repeat R]
+"""
+import os
+import sys
+import random
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tax_logic import FILING_STATUSES, calculate_tax
+from tax_rules import DEFAULT_TAX_YEAR, tax_rules
+
+
+def linear_calculate_tax(taxable_income: float, filing_status: str) -> float:
+    # The pre-compilation implementation, kept here as the baseline
+    brackets = tax_rules.get(DEFAULT_TAX_YEAR).brackets[filing_status]
+    tax = 0.0
+    for bracket in brackets:
+        if taxable_income > bracket.lower:
+            bracket_amount = min(taxable_income, bracket.upper) - bracket.lower
+            tax += bracket_amount * bracket.rate
+        else:
+            break
+    return tax
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=2024)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    inputs = [(rng.choice([rng.uniform(0, 120000), rng.uniform(0, 1500000)]), rng.choice(FILING_STATUSES))
+              for _ in range(args.records)]
+
+    mismatches = sum(1 for income, status in inputs
+                     if linear_calculate_tax(income, status) != calculate_tax(income, status))
+
+    results = {}
+    for name, func in (('linear', linear_calculate_tax), ('compiled', calculate_tax)):
+        timer = timeit.Timer(lambda: [func(income, status) for income, status in inputs])
+        best = min(timer.repeat(repeat=args.repeat, number=1))
+        results[name] = best
+        print(f"{name:>9}: {best * 1e9 / args.records:8.1f} ns/call  ({args.records} calls, best of {args.repeat})")
+
+    print(f"  speedup: {results['linear'] / results['compiled']:.2f}x")
+    print(f"mismatches: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""Load test of the production server: upload throughput as the number of gunicorn workers grows.
+
+For every worker count, starts `gunicorn -c gunicorn.conf.py wsgi:app` on a local port with a
+fresh extraction cache, then has --clients concurrent clients send --requests uploads of distinct
+synthetic W-2 / 1099-NEC / 1099-INT PDFs through POST /upload?wait=..., which returns once the
+document has been extracted and parsed. Reports documents per second and latency percentiles.
+
+Run from the backend directory:
+    python benchmarks/load_test.py [--workers 1 2 4] [--clients 16] [--requests 400] [--output results.json]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import signal
+import argparse
+import tempfile
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_cold_start import git_commit, percentile
+
+
+def make_documents(count: int, seed: int):
+    # Every document has different amounts, so no upload is an extraction cache hit
+    import fitz
+    rng = random.Random(seed)
+    layouts = [
+        lambda a, b: ["Form W-2 Wage and Tax Statement 2024",
+                      "b Employer identification number 1 Wages, tips, other comp 2 Federal income tax withheld",
+                      f"12-3456789 {a:.2f} {b:.2f}"],
+        lambda a, b: ["Form 1099-NEC Nonemployee Compensation 2024",
+                      "PAYER'S TIN RECIPIENT'S TIN Copy B For Recipient",
+                      f"12-3456789 123-45-6789 $ {a:.2f}"],
+        lambda a, b: ["Form 1099-INT Interest Income 2024",
+                      "PAYER'S TIN RECIPIENT'S TIN 1 Interest income",
+                      f"12-3456789 123-45-6789 $ {a:.2f} 2024"]
+    ]
+    documents = []
+    for i in range(count):
+        doc = fitz.open()
+        page = doc.new_page()
+        for row, line in enumerate(layouts[i % 3](rng.uniform(1000, 150000), rng.uniform(100, 20000))):
+            page.insert_text((72, 72 + row * 20), line, fontsize=10)
+        documents.append(doc.tobytes())
+    return documents
+
+
+def multipart(filename: str, data: bytes):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n').encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def upload(base_url: str, session_id: str, filename: str, data: bytes, wait: float):
+    body, content_type = multipart(filename, data)
+    req = urllib.request.Request(f'{base_url}/upload?wait={wait}', data=body, method='POST',
+                                 headers={'Content-Type': content_type, 'X-Session-ID': session_id})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=wait + 30) as response:
+            files = json.loads(response.read())['files']
+            ok = response.status == 200 and all(f.get('status') == 'done' for f in files)
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def wait_until_ready(base_url: str, server: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            with urllib.request.urlopen(base_url + '/', timeout=2):
+                return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn did not start in time")
+
+
+def run_workers(workers: int, documents, args, workdir: str):
+    port = args.port
+    base_url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, PORT=str(port), WEB_WORKERS=str(workers), WEB_ACCESS_LOG='',
+               EXTRACTION_CACHE_DIR=os.path.join(workdir, f'cache-{workers}'),
+               TAX_STORE_PATH=os.path.join(workdir, f'store-{workers}.sqlite3'))
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+                              cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    sessions = [f'load-{workers}-{client}' for client in range(args.clients)]
+    try:
+        wait_until_ready(base_url, server)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            results = list(pool.map(
+                lambda i: upload(base_url, sessions[i % args.clients], f'doc{i}.pdf', documents[i], args.wait),
+                range(len(documents))))
+        elapsed = time.perf_counter() - start
+        for session_id in sessions:
+            req = urllib.request.Request(base_url + '/clear-uploads', method='POST', headers={'X-Session-ID': session_id})
+            urllib.request.urlopen(req, timeout=10).close()
+    finally:
+        # SIGTERM is the graceful path: workers finish their requests and drain their jobs
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=120)
+
+    latencies = sorted(latency for latency, ok in results if ok)
+    failed = sum(1 for _, ok in results if not ok)
+    return {
+        'workers': workers,
+        'requests': len(results),
+        'failed': failed,
+        'documents_per_second': round(len(latencies) / elapsed, 2),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            'p95': round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+            'p99': round(percentile(latencies, 99) * 1000, 2) if latencies else None
+        }
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help="Gunicorn worker counts to test")
+    parser.add_argument('--clients', type=int, default=16, help="Concurrent clients")
+    parser.add_argument('--requests', type=int, default=400, help="Uploads per worker count")
+    parser.add_argument('--wait', type=float, default=60, help="wait= passed to /upload")
+    parser.add_argument('--port', type=int, default=18000)
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--output', '-o', help="Write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    documents = make_documents(args.requests, args.seed)
+    with tempfile.TemporaryDirectory(prefix='load_test_') as workdir:
+        runs = [run_workers(workers, documents, args, workdir) for workers in args.workers]
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'cpus': os.cpu_count(),
+            'clients': args.clients,
+            'extraction_mode': os.environ.get('EXTRACTION_MODE', 'hybrid')
+        },
+        'runs': runs
+    }
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
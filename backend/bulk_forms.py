@@ -0,0 +1,311 @@
+"""Bulk 1040 generation: fill the template for many computed returns across a process pool.
+
+Command line usage, from the backend directory:
+    python bulk_forms.py returns.json --output filled/            # directory of PDFs
+    python bulk_forms.py returns.csv --output filled.zip          # one zip archive
+    python bulk_forms.py returns.json --output filled.tar.gz --workers 8
+"""
+import os
+import io
+import sys
+import json
+import time
+import atexit
+import tarfile
+import multiprocessing
+import threading
+import zipfile
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from werkzeug.utils import secure_filename
+
+from tax_logic import calculate_total_tax
+from tax_rules import DEFAULT_TAX_YEAR, TaxRulesError, tax_rules
+from tax_batch import read_batch_records
+from form_filler import get_1040_template, build_1040_field_values
+
+# Worker processes used to fill forms in bulk
+BULK_FORM_WORKERS = int(os.environ.get("BULK_FORM_WORKERS", os.cpu_count() or 1))
+
+# Returns handed to a worker at a time
+BULK_FORM_CHUNK_SIZE = 8
+
+# Most returns one /forms/bulk request may fill; the command line isn't limited
+BULK_FORM_MAX_RECORDS = int(os.environ.get("BULK_FORM_MAX_RECORDS", 1000))
+
+INCOME_FIELDS = ('wages', 'nec_income', 'interest_income', 'federal_withheld')
+
+
+def complete_return(record: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """Validate a return and fill in any computed values (total income, tax, refund) it lacks."""
+    if not isinstance(record, dict) or not record.get('filing_status'):
+        raise ValueError(f"Return {index}: filing_status is required")
+    try:
+        values = {field: float(record.get(field) or 0) for field in INCOME_FIELDS}
+        values['dependent_children'] = int(record.get('dependent_children') or 0)
+        values['other_dependents'] = int(record.get('other_dependents') or 0)
+    except (TypeError, ValueError):
+        raise ValueError(f"Return {index}: amounts and dependent counts must be numbers")
+    values['filing_status'] = record['filing_status']
+    try:
+        values['tax_year'] = tax_rules.get(record.get('tax_year') or DEFAULT_TAX_YEAR).tax_year
+    except TaxRulesError as e:
+        raise ValueError(f"Return {index}: {e}")
+
+    values['total_income'] = float(record.get('total_income') or
+                                   values['wages'] + values['nec_income'] + values['interest_income'])
+    if record.get('tax_owed') in (None, ''):
+        try:
+            tax_no_credits, tax_owed, _ = calculate_total_tax(
+                values['total_income'], values['filing_status'],
+                values['dependent_children'], values['other_dependents'], values['tax_year']
+            )
+        except KeyError:
+            raise ValueError(f"Return {index}: unknown filing status {values['filing_status']!r}")
+    else:
+        tax_no_credits = float(record.get('tax_no_credits') or record['tax_owed'])
+        tax_owed = float(record['tax_owed'])
+    values['tax_no_credits'] = tax_no_credits
+    values['tax_owed'] = tax_owed
+    values['refund_or_due'] = float(record['refund_or_due']) if record.get('refund_or_due') not in (None, '') \
+        else values['federal_withheld'] - tax_owed
+
+    name = secure_filename(str(record.get('id', index))) or str(index)
+    return {'name': f"{name}_1040.pdf", 'values': values}
+
+
+def complete_returns(returns: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    completed = []
+    names = {}
+    for i, record in enumerate(returns):
+        item = complete_return(record, i)
+        # Two returns writing the same file would overwrite each other or duplicate an archive member
+        if item['name'] in names:
+            raise ValueError(f"Return {i}: id gives the same file name as return {names[item['name']]} ({item['name']})")
+        names[item['name']] = i
+        completed.append(item)
+    return completed
+
+
+def _render_return(completed: Dict[str, Any]) -> Tuple[str, bytes, float]:
+    # Runs in a pool process, which parsed the template when it started
+    start = time.perf_counter()
+    writer = get_1040_template().fill(build_1040_field_values(**completed['values']))
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return completed['name'], buffer.getvalue(), time.perf_counter() - start
+
+
+def _render_chunk(chunk: List[Dict[str, Any]]) -> List[Tuple[str, bytes, float]]:
+    return [_render_return(item) for item in chunk]
+
+
+def _init_worker():
+    # Each pool process parses the template once, before its first chunk
+    get_1040_template()
+
+
+class BulkFormRenderer:
+    """Fills forms for bulk requests on one process pool, shared by every request."""
+
+    def __init__(self, workers: int = BULK_FORM_WORKERS):
+        self.workers = max(1, workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Pool is created on first use so importing the app doesn't start workers. They come from a
+        # forkserver rather than a fork of this multithreaded process, where another request thread
+        # could hold a lock (template, logging, imports) the child would inherit locked
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('forkserver'),
+                                                     initializer=_init_worker)
+            return self._executor
+
+    def render(self, completed: List[Dict[str, Any]]) -> Iterator[Tuple[str, bytes, float]]:
+        """Yield (file name, PDF bytes, render seconds) for every completed return, in input order.
+
+        Only a few chunks are queued ahead of the one being yielded; closing the generator (the
+        client went away) cancels those not started yet.
+        """
+        if self.workers == 1 or len(completed) <= 1:
+            for item in completed:
+                yield _render_return(item)
+            return
+
+        executor = self._get_executor()
+        pending = deque()
+        try:
+            for start in range(0, len(completed), BULK_FORM_CHUNK_SIZE):
+                pending.append(executor.submit(_render_chunk, completed[start:start + BULK_FORM_CHUNK_SIZE]))
+                if len(pending) >= 2 * self.workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+# Shared renderer used by the Flask app
+bulk_renderer = BulkFormRenderer()
+atexit.register(bulk_renderer.shutdown)
+
+
+class BulkStats:
+    """Throughput and per-form latency of a bulk run."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.latencies: List[float] = []
+        self.total_bytes = 0
+
+    def record(self, latency: float, size: int):
+        self.latencies.append(latency)
+        self.total_bytes += size
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+        return {
+            'forms': len(latencies),
+            'elapsed_seconds': round(elapsed, 3),
+            'forms_per_second': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            'latency_ms': {
+                'p50': round(percentile(50) * 1000, 2),
+                'p95': round(percentile(95) * 1000, 2),
+                'p99': round(percentile(99) * 1000, 2),
+                'max': round(latencies[-1] * 1000, 2) if latencies else 0.0
+            },
+            'total_bytes': self.total_bytes
+        }
+
+
+def write_directory(forms: Iterable[Tuple[str, bytes, float]], directory: str) -> Dict[str, Any]:
+    os.makedirs(directory, exist_ok=True)
+    stats = BulkStats()
+    for name, data, latency in forms:
+        with open(os.path.join(directory, name), 'wb') as f:
+            f.write(data)
+        stats.record(latency, len(data))
+    return stats.summary()
+
+
+class _StreamBuffer:
+    # Write-only, non-seekable sink that zipfile/tarfile stream into; drained after each form
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_archive(forms: Iterable[Tuple[str, bytes, float]], archive_format: str = 'zip',
+                   stats: BulkStats = None) -> Iterator[bytes]:
+    """Stream filled forms as a zip or tar archive; a stats.json member is appended at the end.
+
+    Closing the stream closes forms as well, so a disconnected client stops the rendering behind it.
+    """
+    buffer = _StreamBuffer()
+    stats = stats or BulkStats()
+    if archive_format == 'zip':
+        archive = zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED)
+        add = archive.writestr
+    else:
+        archive = tarfile.open(fileobj=buffer, mode='w|gz' if archive_format == 'tar.gz' else 'w|')
+
+        def add(name, data):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            archive.addfile(info, io.BytesIO(data))
+
+    try:
+        for name, data, latency in forms:
+            add(name, data)
+            stats.record(latency, len(data))
+            yield buffer.drain()
+    finally:
+        if hasattr(forms, 'close'):
+            forms.close()
+
+    add('stats.json', json.dumps(stats.summary(), indent=2).encode('utf-8'))
+    archive.close()
+    yield buffer.drain()
+
+
+def archive_format_for(path: str) -> str:
+    if path.endswith('.zip'):
+        return 'zip'
+    if path.endswith(('.tar.gz', '.tgz')):
+        return 'tar.gz'
+    if path.endswith('.tar'):
+        return 'tar'
+    return 'dir'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('returns', help="JSON array (or {\"returns\": [...]}) or CSV of computed returns")
+    parser.add_argument('--output', '-o', required=True, help="Directory, or a .zip / .tar / .tar.gz file")
+    parser.add_argument('--workers', '-w', type=int, default=BULK_FORM_WORKERS)
+    args = parser.parse_args(argv)
+
+    with open(args.returns, 'rb') as f:
+        returns = read_batch_records(f.read(), 'text/csv' if args.returns.endswith('.csv') else 'application/json')
+
+    try:
+        completed = complete_returns(returns)
+    except ValueError as e:
+        print(f"Invalid input: {e}", file=sys.stderr)
+        return 2
+
+    bulk_renderer.workers = max(1, args.workers)
+    forms = bulk_renderer.render(completed)
+    archive_format = archive_format_for(args.output)
+    if archive_format == 'dir':
+        summary = write_directory(forms, args.output)
+    else:
+        stats = BulkStats()
+        with open(args.output, 'wb') as f:
+            for chunk in stream_archive(forms, archive_format, stats):
+                f.write(chunk)
+        summary = stats.summary()
+
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""Bulk ingestion: extract a directory tree of client PDFs offline and write each client's totals.
+
+Every top-level directory under the input root is one client (a PDF directly under the root is a
+client of its own). Documents are extracted and parsed across a process pool exactly as uploads
+are, sharing the extraction cache. Each finished document is appended to a checkpoint file, so an
+interrupted run picks up where it stopped; documents whose size and modification time are
+unchanged since they were checkpointed aren't extracted again. Only deterministic outcomes are
+checkpointed (parse results, including parse errors, and documents over the extraction limits);
+a document whose extraction crashed is reported but retried by the next run.
+
+Command line usage, from the backend directory:
+    python bulk_ingest.py clients/ --output totals.jsonl                  # one JSON object per client
+    python bulk_ingest.py clients/ --output totals.csv --workers 8
+    python bulk_ingest.py clients/ --output totals.parquet                # needs pyarrow
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, List, Tuple
+
+from data_store import TOTAL_FIELDS, to_cents
+from extraction import EXTRACTION_MODE, document_totals, extract_document
+from ocr_engine import ocr_engine
+
+# Worker processes extracting documents
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", os.cpu_count() or 1))
+
+# Seconds between progress lines on stderr
+PROGRESS_INTERVAL = 2.0
+
+OUTPUT_FIELDS = ['client', 'documents', 'parse_errors'] + list(TOTAL_FIELDS)
+
+
+def find_documents(root: str) -> List[Tuple[str, str]]:
+    """(client, path relative to root) of every PDF under root, sorted by path."""
+    documents = []
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories.sort()
+        for filename in sorted(filenames):
+            if not filename.lower().endswith('.pdf'):
+                continue
+            relpath = os.path.relpath(os.path.join(directory, filename), root)
+            parts = relpath.split(os.sep)
+            client = parts[0] if len(parts) > 1 else os.path.splitext(filename)[0]
+            documents.append((client, relpath))
+    return documents
+
+
+def document_key(root: str, relpath: str) -> str:
+    # A document is re-extracted if its size or modification time changed since it was checkpointed
+    stat = os.stat(os.path.join(root, relpath))
+    return f"{relpath}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def load_checkpoint(path: str) -> Dict[str, Dict[str, Any]]:
+    """Checkpointed results by document key; a line cut short by an interrupted write is ignored."""
+    results = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                results[entry['key']] = entry
+    except FileNotFoundError:
+        pass
+    return results
+
+
+def _init_worker():
+    # Documents are already spread across processes, so each one OCRs its pages inline
+    ocr_engine.workers = 1
+
+
+def _failed_entry(client: str, relpath: str, key: str, error: Exception, seconds: float) -> Dict[str, Any]:
+    # An unexpected failure (unreadable file, OCR crash, lost worker) may not happen again, so the
+    # entry is marked for retry and kept out of the checkpoint
+    return {
+        'key': key,
+        'client': client,
+        'path': relpath,
+        'type': 'unknown',
+        'error': f"Extraction failed: {error}",
+        'amounts': {},
+        'cached': False,
+        'seconds': round(seconds, 4),
+        'retry': True
+    }
+
+
+def _ingest_document(root: str, client: str, relpath: str, key: str) -> Dict[str, Any]:
+    # Runs in a pool process
+    start = time.perf_counter()
+    try:
+        with open(os.path.join(root, relpath), 'rb') as f:
+            pdf_bytes = f.read()
+        # Parse errors and documents over the extraction limits come back as documents with an error
+        document, cached = extract_document(pdf_bytes, hashlib.sha256(pdf_bytes).hexdigest())
+    except Exception as e:
+        return _failed_entry(client, relpath, key, e, time.perf_counter() - start)
+    return {
+        'key': key,
+        'client': client,
+        'path': relpath,
+        'type': document.get('type'),
+        'error': document.get('error'),
+        'amounts': document_totals(document),
+        'cached': cached,
+        'seconds': round(time.perf_counter() - start, 4)
+    }
+
+
+def ingest(root: str, checkpoint_path: str, workers: int = INGEST_WORKERS, progress=sys.stderr) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Extract every document not already in the checkpoint; returns (results by key, run summary)."""
+    documents = [(client, relpath, document_key(root, relpath)) for client, relpath in find_documents(root)]
+    results = load_checkpoint(checkpoint_path)
+    pending = [document for document in documents if document[2] not in results]
+    resumed = len(documents) - len(pending)
+
+    start = time.perf_counter()
+    last_report = start
+    latencies = []
+    with open(checkpoint_path, 'a') as checkpoint, \
+            ProcessPoolExecutor(max_workers=max(1, workers), initializer=_init_worker) as executor:
+        futures = {executor.submit(_ingest_document, root, client, relpath, key): (client, relpath, key)
+                   for client, relpath, key in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                entry = future.result()
+            except Exception as e:
+                # The worker process died, e.g. killed for running out of memory
+                entry = _failed_entry(*futures[future], e, 0.0)
+            results[entry['key']] = entry
+            latencies.append(entry['seconds'])
+            if not entry.get('retry'):
+                checkpoint.write(json.dumps(entry) + "\n")
+                checkpoint.flush()
+
+            now = time.perf_counter()
+            if progress and (now - last_report >= PROGRESS_INTERVAL or done == len(pending)):
+                last_report = now
+                rate = done / (now - start)
+                eta = (len(pending) - done) / rate if rate else 0.0
+                print(f"{resumed + done}/{len(documents)} documents, {rate:.1f} docs/s, "
+                      f"ETA {eta:.0f}s", file=progress, flush=True)
+
+    elapsed = time.perf_counter() - start
+    current = {key for _, _, key in documents}
+    results = {key: entry for key, entry in results.items() if key in current}
+    latencies.sort()
+
+    def percentile(p):
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+    summary = {
+        'documents': len(documents),
+        'extracted': len(pending),
+        'resumed': resumed,
+        'cached': sum(1 for entry in results.values() if entry['cached']),
+        'parse_errors': sum(1 for entry in results.values() if entry['error']),
+        'failed': sum(1 for entry in results.values() if entry.get('retry')),
+        'elapsed_seconds': round(elapsed, 3),
+        'documents_per_second': round(len(pending) / elapsed, 2) if elapsed and pending else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(50) * 1000, 2),
+            'p95': round(percentile(95) * 1000, 2),
+            'max': round(latencies[-1] * 1000, 2) if latencies else 0.0
+        },
+        'workers': workers,
+        'extraction_mode': EXTRACTION_MODE
+    }
+    return results, summary
+
+
+def client_totals(results: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One row per client with its document counts and summed totals, sorted by client."""
+    clients = {}
+    for entry in results:
+        row = clients.setdefault(entry['client'], {'client': entry['client'], 'documents': 0, 'parse_errors': 0,
+                                                   'cents': dict.fromkeys(TOTAL_FIELDS, 0)})
+        row['documents'] += 1
+        row['parse_errors'] += 1 if entry['error'] else 0
+        # Summed in whole cents, like the session totals
+        for field, cents in to_cents(entry['amounts']).items():
+            row['cents'][field] += cents
+    rows = []
+    for client in sorted(clients):
+        row = clients[client]
+        cents = row.pop('cents')
+        rows.append({**row, **{field: cents[field] / 100 for field in TOTAL_FIELDS}})
+    return rows
+
+
+def write_output(rows: List[Dict[str, Any]], path: str):
+    if path.endswith('.parquet'):
+        import pyarrow
+        import pyarrow.parquet
+        table = pyarrow.table({field: [row[field] for row in rows] for field in OUTPUT_FIELDS})
+        pyarrow.parquet.write_table(table, path)
+    elif path.endswith('.csv'):
+        import csv
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, 'w') as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('root', help="Directory with one subdirectory of PDFs per client")
+    parser.add_argument('--output', '-o', required=True, help="Client totals: .jsonl, .csv or .parquet")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: <output>.checkpoint.jsonl)")
+    parser.add_argument('--workers', '-w', type=int, default=INGEST_WORKERS)
+    parser.add_argument('--quiet', '-q', action='store_true', help="No progress lines on stderr")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.root):
+        print(f"Not a directory: {args.root}", file=sys.stderr)
+        return 2
+    if args.output.endswith('.parquet'):
+        try:
+            import pyarrow
+        except ImportError:
+            print("Writing .parquet needs pyarrow (pip install pyarrow)", file=sys.stderr)
+            return 2
+
+    checkpoint = args.checkpoint or f"{args.output}.checkpoint.jsonl"
+    results, summary = ingest(args.root, checkpoint, args.workers, None if args.quiet else sys.stderr)
+    rows = client_totals(results.values())
+    write_output(rows, args.output)
+
+    summary['clients'] = len(rows)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
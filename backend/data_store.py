@@ -0,0 +1,399 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+# 'memory' keeps sessions in this process; 'sqlite' shares them between worker processes
+TAX_STORE_BACKEND = os.environ.get("TAX_STORE_BACKEND", "memory")
+
+# SQLite file used by the 'sqlite' backend
+TAX_STORE_PATH = os.environ.get(
+    "TAX_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tax_store.sqlite3')
+)
+
+# Sessions untouched for this long are evicted
+SESSION_TTL_SECONDS = int(os.environ.get("SESSION_TTL_SECONDS", 2 * 3600))
+
+#Running totals kept for every session
+TOTAL_FIELDS = ("wages", "federal_withheld", "nec_income", "interest_income")
+
+
+def empty_totals() -> Dict[str, float]:
+    return {field: 0.0 for field in TOTAL_FIELDS}
+
+
+# Totals are kept in whole cents so removing a document subtracts exactly what adding it added
+def to_cents(amounts: Dict[str, float]) -> Dict[str, int]:
+    return {field: round(amount * 100) for field, amount in amounts.items()}
+
+
+def from_cents(cents: Dict[str, int]) -> Dict[str, float]:
+    return {field: amount / 100 for field, amount in cents.items()}
+
+
+def document_entry(filename: str, file_hash: str, doc_type: Optional[str], cents: Optional[Dict[str, int]]) -> dict:
+    # Ledger entry as returned by list_documents; amounts are None until the document is processed
+    return {
+        'name': filename,
+        'file_hash': file_hash,
+        'type': doc_type,
+        'amounts': from_cents(cents) if cents is not None else None
+    }
+
+
+class MemoryBackend:
+    """Per-session tax data held in this process, guarded by one lock."""
+
+    def __init__(self, ttl: int = SESSION_TTL_SECONDS):
+        self.ttl = ttl
+        self._sessions: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _session(self, session_id: str) -> dict:
+        # Caller holds the lock
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = {
+                'totals': dict.fromkeys(TOTAL_FIELDS, 0),
+                'personal_info': {},
+                'uploaded_hashes': {},
+                # Ledger: filename -> {'file_hash', 'type', 'amounts' (cents, None while processing)}
+                'documents': {},
+                'generation': 0
+            }
+            self._sessions[session_id] = session
+        session['touched'] = time.time()
+        return session
+
+    def get_totals(self, session_id: str) -> Dict[str, float]:
+        with self._lock:
+            return from_cents(self._session(session_id)['totals'])
+
+    def get_generation(self, session_id: str) -> int:
+        with self._lock:
+            return self._session(session_id)['generation']
+
+    def record_document(self, session_id: str, filename: str, file_hash: str, doc_type: str,
+                        amounts: Dict[str, float], generation: Optional[int] = None) -> bool:
+        """Enter a claimed document's amounts in the ledger and the totals.
+
+        Returns False, changing nothing, if the session was reset since `generation` or the
+        document was removed or replaced while it was being processed.
+        """
+        with self._lock:
+            session = self._session(session_id)
+            document = session['documents'].get(filename)
+            if generation is not None and generation != session['generation']:
+                return False
+            if document is None or document['file_hash'] != file_hash:
+                return False
+            cents = to_cents(amounts)
+            for field, amount in (document['amounts'] or {}).items():
+                session['totals'][field] -= amount
+            for field, amount in cents.items():
+                session['totals'][field] += amount
+            document['type'] = doc_type
+            document['amounts'] = cents
+            return True
+
+    def remove_document(self, session_id: str, filename: str) -> bool:
+        """Take a document out of the ledger and its amounts out of the totals; False if it isn't there."""
+        with self._lock:
+            return self._remove_document(self._session(session_id), filename)
+
+    @staticmethod
+    def _remove_document(session: dict, filename: str) -> bool:
+        # Caller holds the lock
+        document = session['documents'].pop(filename, None)
+        if document is None:
+            return False
+        for field, amount in (document['amounts'] or {}).items():
+            session['totals'][field] -= amount
+        if session['uploaded_hashes'].get(document['file_hash']) == filename:
+            del session['uploaded_hashes'][document['file_hash']]
+        return True
+
+    def list_documents(self, session_id: str) -> List[dict]:
+        with self._lock:
+            return [document_entry(filename, document['file_hash'], document['type'], document['amounts'])
+                    for filename, document in self._session(session_id)['documents'].items()]
+
+    def reset(self, session_id: str):
+        """Zero the totals and forget uploaded documents; in-flight results are discarded."""
+        with self._lock:
+            session = self._session(session_id)
+            session['totals'] = dict.fromkeys(TOTAL_FIELDS, 0)
+            session['uploaded_hashes'] = {}
+            session['documents'] = {}
+            session['generation'] += 1
+
+    def get_personal_info(self, session_id: str) -> dict:
+        with self._lock:
+            return dict(self._session(session_id)['personal_info'])
+
+    def set_personal_info(self, session_id: str, info: dict) -> dict:
+        with self._lock:
+            session = self._session(session_id)
+            session['personal_info'].update(info)
+            return dict(session['personal_info'])
+
+    def claim_upload(self, session_id: str, file_hash: str, filename: str) -> str:
+        """Record filename for file_hash, returning the name it was first uploaded under.
+
+        A newly claimed file gets a ledger entry, filled in by record_document once it's processed;
+        it replaces a different document previously uploaded under the same name.
+        """
+        with self._lock:
+            session = self._session(session_id)
+            claimed = session['uploaded_hashes'].get(file_hash)
+            if claimed is not None:
+                return claimed
+            self._remove_document(session, filename)
+            session['uploaded_hashes'][file_hash] = filename
+            session['documents'][filename] = {'file_hash': file_hash, 'type': None, 'amounts': None}
+            return filename
+
+    def is_active(self, session_id: str) -> bool:
+        """Whether the session exists and hasn't expired; unlike the other methods, doesn't touch it."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session is not None and session['touched'] >= time.time() - self.ttl
+
+    def evict_expired(self) -> List[str]:
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [sid for sid, session in self._sessions.items() if session['touched'] < cutoff]
+            for sid in expired:
+                del self._sessions[sid]
+        return expired
+
+
+class SQLiteDatabase:
+    """Thread-local connections to the SQLite file shared by every worker process on the host.
+
+    Subclasses pass the schema of the tables they keep there, created if missing.
+    """
+
+    def __init__(self, path: str = TAX_STORE_PATH, schema: str = ""):
+        self.path = path
+        self._local = threading.local()
+        if schema:
+            self._connection().executescript(schema)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers proceed while another process writes
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+
+class SQLiteBackend(SQLiteDatabase):
+    """Per-session tax data in a local SQLite file, shared by every worker process on the host."""
+
+    def __init__(self, path: str = TAX_STORE_PATH, ttl: int = SESSION_TTL_SECONDS):
+        self.ttl = ttl
+        super().__init__(path, """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                personal_info TEXT NOT NULL DEFAULT '{}',
+                generation INTEGER NOT NULL DEFAULT 0,
+                touched REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS totals_cents (
+                session_id TEXT NOT NULL,
+                field TEXT NOT NULL,
+                cents INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (session_id, field)
+            );
+            CREATE TABLE IF NOT EXISTS documents (
+                session_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                file_hash TEXT NOT NULL,
+                doc_type TEXT,
+                amounts TEXT,
+                PRIMARY KEY (session_id, filename)
+            );
+            CREATE TABLE IF NOT EXISTS uploaded_hashes (
+                session_id TEXT NOT NULL,
+                file_hash TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                PRIMARY KEY (session_id, file_hash)
+            );
+            CREATE INDEX IF NOT EXISTS sessions_touched ON sessions (touched);
+        """)
+
+    def _session(self, conn: sqlite3.Connection, session_id: str) -> tuple:
+        now = time.time()
+        conn.execute(
+            "INSERT INTO sessions (session_id, touched) VALUES (?, ?) "
+            "ON CONFLICT (session_id) DO UPDATE SET touched = excluded.touched",
+            (session_id, now)
+        )
+        return conn.execute(
+            "SELECT personal_info, generation FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+
+    def get_totals(self, session_id: str) -> Dict[str, float]:
+        with self._transaction() as conn:
+            self._session(conn, session_id)
+            totals = empty_totals()
+            totals.update(from_cents(dict(conn.execute(
+                "SELECT field, cents FROM totals_cents WHERE session_id = ?", (session_id,)
+            ).fetchall())))
+            return totals
+
+    def get_generation(self, session_id: str) -> int:
+        with self._transaction() as conn:
+            return self._session(conn, session_id)[1]
+
+    @staticmethod
+    def _add_cents(conn: sqlite3.Connection, session_id: str, cents: Dict[str, int], sign: int = 1):
+        conn.executemany(
+            "INSERT INTO totals_cents (session_id, field, cents) VALUES (?, ?, ?) "
+            "ON CONFLICT (session_id, field) DO UPDATE SET cents = cents + excluded.cents",
+            [(session_id, field, sign * amount) for field, amount in cents.items()]
+        )
+
+    def record_document(self, session_id: str, filename: str, file_hash: str, doc_type: str,
+                        amounts: Dict[str, float], generation: Optional[int] = None) -> bool:
+        with self._transaction() as conn:
+            if generation is not None and generation != self._session(conn, session_id)[1]:
+                return False
+            row = conn.execute(
+                "SELECT file_hash, amounts FROM documents WHERE session_id = ? AND filename = ?",
+                (session_id, filename)
+            ).fetchone()
+            if row is None or row[0] != file_hash:
+                return False
+            cents = to_cents(amounts)
+            if row[1] is not None:
+                self._add_cents(conn, session_id, json.loads(row[1]), sign=-1)
+            self._add_cents(conn, session_id, cents)
+            conn.execute(
+                "UPDATE documents SET doc_type = ?, amounts = ? WHERE session_id = ? AND filename = ?",
+                (doc_type, json.dumps(cents), session_id, filename)
+            )
+            return True
+
+    def remove_document(self, session_id: str, filename: str) -> bool:
+        with self._transaction() as conn:
+            self._session(conn, session_id)
+            return self._remove_document(conn, session_id, filename)
+
+    def _remove_document(self, conn: sqlite3.Connection, session_id: str, filename: str) -> bool:
+        # Caller holds the transaction
+        row = conn.execute(
+            "SELECT file_hash, amounts FROM documents WHERE session_id = ? AND filename = ?",
+            (session_id, filename)
+        ).fetchone()
+        if row is None:
+            return False
+        conn.execute("DELETE FROM documents WHERE session_id = ? AND filename = ?", (session_id, filename))
+        if row[1] is not None:
+            self._add_cents(conn, session_id, json.loads(row[1]), sign=-1)
+        conn.execute(
+            "DELETE FROM uploaded_hashes WHERE session_id = ? AND file_hash = ? AND filename = ?",
+            (session_id, row[0], filename)
+        )
+        return True
+
+    def list_documents(self, session_id: str) -> List[dict]:
+        with self._transaction() as conn:
+            self._session(conn, session_id)
+            return [document_entry(filename, file_hash, doc_type, json.loads(amounts) if amounts else None)
+                    for filename, file_hash, doc_type, amounts in conn.execute(
+                        "SELECT filename, file_hash, doc_type, amounts FROM documents WHERE session_id = ? ORDER BY rowid",
+                        (session_id,)
+                    )]
+
+    def reset(self, session_id: str):
+        with self._transaction() as conn:
+            self._session(conn, session_id)
+            conn.execute("DELETE FROM totals_cents WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM uploaded_hashes WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM documents WHERE session_id = ?", (session_id,))
+            conn.execute("UPDATE sessions SET generation = generation + 1 WHERE session_id = ?", (session_id,))
+
+    def get_personal_info(self, session_id: str) -> dict:
+        with self._transaction() as conn:
+            return json.loads(self._session(conn, session_id)[0])
+
+    def set_personal_info(self, session_id: str, info: dict) -> dict:
+        with self._transaction() as conn:
+            personal_info = json.loads(self._session(conn, session_id)[0])
+            personal_info.update(info)
+            conn.execute(
+                "UPDATE sessions SET personal_info = ? WHERE session_id = ?",
+                (json.dumps(personal_info), session_id)
+            )
+            return personal_info
+
+    def claim_upload(self, session_id: str, file_hash: str, filename: str) -> str:
+        with self._transaction() as conn:
+            self._session(conn, session_id)
+            claimed = conn.execute(
+                "SELECT filename FROM uploaded_hashes WHERE session_id = ? AND file_hash = ?",
+                (session_id, file_hash)
+            ).fetchone()
+            if claimed is not None:
+                return claimed[0]
+            self._remove_document(conn, session_id, filename)
+            conn.execute(
+                "INSERT INTO uploaded_hashes (session_id, file_hash, filename) VALUES (?, ?, ?)",
+                (session_id, file_hash, filename)
+            )
+            conn.execute(
+                "INSERT INTO documents (session_id, filename, file_hash) VALUES (?, ?, ?)",
+                (session_id, filename, file_hash)
+            )
+            return filename
+
+    def is_active(self, session_id: str) -> bool:
+        return self._connection().execute(
+            "SELECT 1 FROM sessions WHERE session_id = ? AND touched >= ?", (session_id, time.time() - self.ttl)
+        ).fetchone() is not None
+
+    def evict_expired(self) -> List[str]:
+        cutoff = time.time() - self.ttl
+        with self._transaction() as conn:
+            expired = [row[0] for row in conn.execute(
+                "SELECT session_id FROM sessions WHERE touched < ?", (cutoff,)
+            )]
+            for table in ("totals_cents", "uploaded_hashes", "documents", "sessions"):
+                conn.executemany(f"DELETE FROM {table} WHERE session_id = ?", [(sid,) for sid in expired])
+        return expired
+
+
+class _Transaction:
+    # BEGIN IMMEDIATE takes the write lock up front so read-modify-write steps can't interleave
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def create_store(backend: str = TAX_STORE_BACKEND):
+    if backend == 'sqlite':
+        return SQLiteBackend()
+    if backend == 'memory':
+        return MemoryBackend()
+    raise ValueError(f"Unknown TAX_STORE_BACKEND: {backend}")
+
+
+# Shared store used by the Flask app
+tax_data_store = create_store()
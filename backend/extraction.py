@@ -0,0 +1,207 @@
+import os
+import io
+
+from ocr_engine import ocr_engine, ocr_page, ocr_words, ocr_number, open_pdf
+from extraction_cache import extraction_cache
+from form_specs import form_parser
+from layout_extraction import PageLayout, words_to_lines
+from pdf_classifier import classify_pdf
+from extraction_limits import DEFAULT_EXTRACTION_LIMITS, DocumentBudget, ExtractionLimitExceeded
+from metrics import (
+    STAGE_SECONDS, DOCUMENTS, PARSE_ERRORS, OCR_FALLBACKS, CACHE_LOOKUPS, PDF_CLASSIFICATIONS,
+    DOCUMENT_PEAK_MEMORY, EXTRACTION_LIMITS_EXCEEDED
+)
+
+#Text extraction and parsing of one tax document, shared by the upload jobs and bulk_ingest.py
+
+# Text extraction strategy: 'hybrid' (pdfplumber with OCR fallback), 'single_pass'
+# (one PyMuPDF pass, OCR only for pages without a text layer, stop once the form is parsed)
+# or 'layout' (box values read from word positions around each box's label)
+EXTRACTION_MODE = os.environ.get("EXTRACTION_MODE", "hybrid")
+
+# In hybrid mode, classify each PDF from its structure first and send scans straight to OCR
+# instead of finding out from an empty pdfplumber pass
+CLASSIFY_PDFS = os.environ.get("CLASSIFY_PDFS", "1").lower() not in ("0", "false", "no", "")
+
+#Bump when parsing changes so cached documents are re-parsed from their cached text
+PARSER_VERSION = 1
+
+#Maps parsed document fields to the running totals they feed
+DOCUMENT_TOTALS = {
+    "wages": "wages",
+    "federal_income_tax_withheld": "federal_withheld",
+    "nonemployee_compensation": "nec_income",
+    "interest_income": "interest_income"
+}
+
+def document_totals(document):
+    # Amounts a successfully parsed document adds to the running totals
+    if document.get("error") or not document.get("data"):
+        return {}
+    return {DOCUMENT_TOTALS[field]: value for field, value in document["data"].items()}
+
+def parse_tax_document(text):
+    # Classify the document and extract its values in one pass over the compiled form specs
+    return form_parser.parse(text)
+
+#Every extractor takes an optional DocumentBudget, charged page by page; going over one of its
+#limits raises ExtractionLimitExceeded and stops the document where it is
+
+#Extract text from scanned PDF (a path or the file's bytes) using OCR
+def extract_text_with_ocr(source, budget=None):
+    # Pages are OCRed in parallel on the engine's process pool and streamed back in page order,
+    # each page's image freed as soon as it's read
+    with STAGE_SECONDS.time(stage='ocr'):
+        return "".join(page_text + "\n" for page_text in ocr_engine.iter_pages(source, budget=budget))
+
+#Single-pass extraction: one open, per-page OCR only where needed, early exit once parsed
+def extract_text_single_pass(source, budget=None):
+    page_texts = []
+    with open_pdf(source) as doc:
+        for page in doc:
+            # Reading the text layer through PyMuPDF is far cheaper than pdfplumber's layout pass
+            page_text = words_to_lines(page.get_text("words"))
+            if len(page_text.strip()) < 50:
+                OCR_FALLBACKS.inc(mode='single_pass')
+                with STAGE_SECONDS.time(stage='ocr'):
+                    page_text = ocr_page(page, ocr_engine.settings, budget)
+            elif budget is not None:
+                budget.charge()
+            page_texts.append(page_text)
+
+            # Stop as soon as the form type and its box values have been found
+            if not parse_tax_document("\n".join(page_texts)).get("error"):
+                break
+    return "\n".join(page_texts)
+
+#Layout extraction: each page's word boxes are read once and the values are taken from the
+#regions under the box labels in form_specs, so line order doesn't matter. Returns (text, document)
+def extract_document_layout(source, budget=None):
+    page_texts = []
+    with open_pdf(source) as doc:
+        for page in doc:
+            layout = PageLayout(page.get_text("words"))
+            page_text = layout.text()
+            reread = None
+            if len(page_text.strip()) < 50:
+                # Scanned page: OCR word boxes, then re-read the box values digits-only
+                OCR_FALLBACKS.inc(mode='layout')
+                with STAGE_SECONDS.time(stage='ocr'):
+                    layout = PageLayout(ocr_words(page, ocr_engine.settings, budget))
+                page_text = layout.text()
+                reread = lambda rect, page=page: ocr_number(page, rect, ocr_engine.settings, budget)
+            elif budget is not None:
+                budget.charge()
+            page_texts.append(page_text)
+
+            spec = form_parser.classify("\n".join(page_texts))
+            data = layout.read_boxes(spec, reread) if spec else None
+            if data is not None:
+                return "\n".join(page_texts), {"type": spec.form_type, "data": data}
+
+    # Boxes weren't where the spec expects them: use the line rules
+    text = "\n".join(page_texts)
+    return text, parse_tax_document(text)
+
+def record_pdf_class(pdf_class, outcome):
+    # A 'digital' PDF that still needed OCR is a misclassification worth tuning the classifier for
+    if pdf_class is not None:
+        PDF_CLASSIFICATIONS.inc(kind=pdf_class.kind, reason=pdf_class.reason, outcome=outcome)
+
+#Hybrid text extraction with fallback to OCR; source is a path or the PDF's bytes
+def extract_text_from_pdf(source, budget=None):
+    if EXTRACTION_MODE == 'single_pass':
+        return extract_text_single_pass(source, budget)
+    if EXTRACTION_MODE == 'layout':
+        return extract_document_layout(source, budget)[0]
+
+    pdf_class = None
+    if CLASSIFY_PDFS:
+        with STAGE_SECONDS.time(stage='classify'):
+            pdf_class = classify_pdf(source)
+        if pdf_class.kind == 'scanned':
+            record_pdf_class(pdf_class, 'routed')
+            return extract_text_with_ocr(source, budget)
+
+    import pdfplumber
+    try:
+        # Regular text extraction: digital PDFs, and ones the classifier couldn't decide on
+        pdf_file = io.BytesIO(source) if isinstance(source, bytes) else source
+        with STAGE_SECONDS.time(stage='pdfplumber'), pdfplumber.open(pdf_file) as pdf:
+            text = "\n".join(plumber_page_texts(pdf, budget))
+        
+        # If we get less text (likely scanned PDF), try OCR
+        if len(text.strip()) < 50:
+            record_pdf_class(pdf_class, 'ocr_fallback')
+            OCR_FALLBACKS.inc(mode='hybrid')
+            return extract_text_with_ocr(source, budget)
+        record_pdf_class(pdf_class, 'routed')
+        return text
+    except ExtractionLimitExceeded:
+        raise
+    except Exception as e:
+        print(f"PDF text extraction failed: {e}")
+        record_pdf_class(pdf_class, 'ocr_fallback')
+        OCR_FALLBACKS.inc(mode='hybrid')
+        return extract_text_with_ocr(source, budget)
+
+def pdf_page_count(source):
+    # 0 for a file PyMuPDF can't open; the extraction path reports it the way it always has
+    try:
+        with open_pdf(source) as doc:
+            return doc.page_count
+    except Exception:
+        return 0
+
+def plumber_page_texts(pdf, budget=None):
+    # pdfplumber caches every parsed page on the document; drop each one once its text is read
+    for page in pdf.pages:
+        try:
+            yield page.extract_text() or ""
+            if budget is not None:
+                budget.charge()
+        finally:
+            page.flush_cache()
+
+def extract_document(pdf_bytes, file_hash, limits=DEFAULT_EXTRACTION_LIMITS):
+    """Parsed document for a PDF and whether it came from the extraction cache.
+
+    A document over its page, pixel or time limits comes back as an error document, and isn't cached.
+    """
+    # Repeat documents are served from the extraction cache and skip extraction entirely
+    cached = extraction_cache.get(file_hash)
+    CACHE_LOOKUPS.inc(result='miss' if cached is None else 'hit')
+    if cached is not None:
+        extracted_text = cached["text"]
+        if cached.get("parser_version") == PARSER_VERSION:
+            document = cached["document"]
+        else:
+            with STAGE_SECONDS.time(stage='parse'):
+                document = parse_tax_document(extracted_text)
+            extraction_cache.put(file_hash, {"text": extracted_text, "document": document, "parser_version": PARSER_VERSION})
+    else:
+        budget = DocumentBudget(limits)
+        try:
+            # Extract from the bytes received with the upload, never from a saved copy
+            with STAGE_SECONDS.time(stage='extract'):
+                budget.check_pages(pdf_page_count(pdf_bytes))
+                if EXTRACTION_MODE == 'layout':
+                    extracted_text, document = extract_document_layout(pdf_bytes, budget)
+                else:
+                    extracted_text = extract_text_from_pdf(pdf_bytes, budget)
+                    document = None
+        except ExtractionLimitExceeded as e:
+            EXTRACTION_LIMITS_EXCEEDED.inc(limit=e.limit)
+            extracted_text, document = None, {"type": "unknown", "error": str(e)}
+        finally:
+            DOCUMENT_PEAK_MEMORY.observe(budget.peak_memory)
+        if document is None:
+            with STAGE_SECONDS.time(stage='parse'):
+                document = parse_tax_document(extracted_text)
+        if extracted_text is not None:
+            extraction_cache.put(file_hash, {"text": extracted_text, "document": document, "parser_version": PARSER_VERSION})
+
+    DOCUMENTS.inc(type=document["type"])
+    if document.get("error"):
+        PARSE_ERRORS.inc(type=document["type"])
+    return document, cached is not None
@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Cache lives next to the uploads folder but is never wiped, so it survives restarts
+CACHE_FOLDER = os.environ.get(
+    "EXTRACTION_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+)
+
+# Total size of cached entries before the least recently used ones are evicted
+CACHE_MAX_BYTES = int(os.environ.get("EXTRACTION_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# Seconds between rescans of the cache folder, which count entries written by other processes
+# (gunicorn workers, bulk ingestion) against the size limit
+CACHE_RESCAN_SECONDS = 30
+
+
+class ExtractionCache:
+    """On-disk cache of extracted text and parsed results, keyed by file hash, evicted LRU by size.
+
+    The size limit holds for the folder as a whole: every process sharing it rescans the folder
+    periodically, and evicts by modification time, which each read refreshes.
+    """
+
+    def __init__(self, folder: str = CACHE_FOLDER, max_bytes: int = CACHE_MAX_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> entry size, least recently used first
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._scanned_at = 0.0
+        os.makedirs(self.folder, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, f"{key}.json")
+
+    def _load_index(self):
+        # Rebuild LRU order from modification times, left by previous runs and other processes;
+        # caller holds the lock (or is __init__)
+        entries = []
+        for name in os.listdir(self.folder):
+            if not name.endswith('.json'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, name[:-len('.json')], stat.st_size))
+        self._index = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self._total_bytes = sum(self._index.values())
+        self._scanned_at = time.monotonic()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        # Touch the entry so the LRU order also holds across restarts
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any]):
+        data = json.dumps(entry).encode('utf-8')
+        if len(data) > self.max_bytes:
+            return
+
+        # Write to a temporary file first so readers never see a partial entry
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if time.monotonic() - self._scanned_at >= CACHE_RESCAN_SECONDS:
+                self._load_index()
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        # Caller holds the lock
+        while self._total_bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+
+# Shared cache used by the Flask app
+extraction_cache = ExtractionCache()
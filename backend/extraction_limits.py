@@ -0,0 +1,86 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+# A document over any of these limits is reported as an extraction error instead of being processed
+MAX_PDF_PAGES = int(os.environ.get("MAX_PDF_PAGES", 100))
+# Pixels rendered for OCR across all pages of one document (a letter page at 300 dpi is ~8.4M)
+EXTRACTION_PIXEL_BUDGET = int(os.environ.get("EXTRACTION_PIXEL_BUDGET", 400_000_000))
+EXTRACTION_TIMEOUT_SECONDS = float(os.environ.get("EXTRACTION_TIMEOUT_SECONDS", 120))
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes; 0 where /proc isn't available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class ExtractionLimitExceeded(ValueError):
+    def __init__(self, limit: str, message: str):
+        super().__init__(message)
+        self.limit = limit
+
+    def __reduce__(self):
+        # Raised inside OCR worker processes and pickled back to the parent
+        return self.__class__, (self.limit, str(self))
+
+
+@dataclass(frozen=True)
+class ExtractionLimits:
+    max_pages: int = MAX_PDF_PAGES
+    max_pixels: int = EXTRACTION_PIXEL_BUDGET
+    max_seconds: float = EXTRACTION_TIMEOUT_SECONDS
+
+    def timeout_error(self) -> ExtractionLimitExceeded:
+        return ExtractionLimitExceeded('time', f"Document took longer than {self.max_seconds:g}s to extract")
+
+
+DEFAULT_EXTRACTION_LIMITS = ExtractionLimits()
+
+
+class DocumentBudget:
+    """Pages, rendered pixels and time one document's extraction may use, and the memory it peaked at.
+
+    Extraction code charges the budget as it goes; going over raises ExtractionLimitExceeded.
+    Memory is the growth of this process's RSS over its value when the document started, sampled
+    while page images are alive, or as reported by the OCR worker that rendered a page.
+    """
+
+    def __init__(self, limits: ExtractionLimits = DEFAULT_EXTRACTION_LIMITS, deadline: Optional[float] = None):
+        self.limits = limits
+        # An OCR worker is given the document's deadline (time.monotonic() is system-wide) so a page
+        # doesn't get the whole time limit again
+        self.deadline = deadline if deadline is not None else time.monotonic() + limits.max_seconds
+        self.pixels = 0
+        self._rss_start = current_rss()
+        self.peak_memory = 0
+
+    def check_pages(self, page_count: int):
+        if page_count > self.limits.max_pages:
+            raise ExtractionLimitExceeded(
+                'pages', f"Document has {page_count} pages, more than the limit of {self.limits.max_pages}")
+
+    def remaining_seconds(self) -> float:
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def charge(self, pixels: int = 0, memory: Optional[int] = None):
+        """Account for rendered pixels and a memory sample (default: this process, now), then check the limits."""
+        self.pixels += pixels
+        if memory is None and self._rss_start:
+            memory = current_rss() - self._rss_start
+        if memory:
+            self.peak_memory = max(self.peak_memory, memory)
+        if self.pixels > self.limits.max_pixels:
+            raise ExtractionLimitExceeded(
+                'pixels', f"Document needs more than {self.limits.max_pixels} pixels rendered for OCR")
+        if time.monotonic() > self.deadline:
+            raise self.limits.timeout_error()
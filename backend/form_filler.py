@@ -0,0 +1,119 @@
+import os
+import io
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+
+from tax_rules import DEFAULT_TAX_YEAR, tax_rules
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '1040_template.pdf')
+
+
+class PdfFormTemplate:
+    """A fillable PDF parsed once and treated as read-only; every fill works on a fresh clone."""
+
+    def __init__(self, path: str):
+        from PyPDF2 import PdfReader
+        with open(path, 'rb') as f:
+            self._reader = PdfReader(io.BytesIO(f.read()))
+        self._lock = threading.Lock()
+        self.field_pages = self._index_fields()
+
+        # The first clone resolves every object of the template, later clones only copy them
+        self.clone()
+
+    def _index_fields(self) -> Dict[str, int]:
+        # Which page each AcroForm widget lives on, keyed by field name
+        field_pages = {}
+        for page_number, page in enumerate(self._reader.pages):
+            annots = page.get('/Annots')
+            for annot in (annots.get_object() if annots else []):
+                name = annot.get_object().get('/T')
+                if name is not None:
+                    field_pages.setdefault(str(name), page_number)
+        return field_pages
+
+    def clone(self) -> "PdfWriter":
+        from PyPDF2 import PdfWriter
+        writer = PdfWriter()
+        # PdfReader isn't thread-safe; cloning only reads it, so the template itself never changes
+        with self._lock:
+            for page in self._reader.pages:
+                writer.add_page(page)
+        return writer
+
+    def fill(self, field_values: Dict[str, str]) -> "PdfWriter":
+        """Clone the template and set field values, touching only the pages that hold those fields."""
+        writer = self.clone()
+        values_by_page = defaultdict(dict)
+        for name, value in field_values.items():
+            page_number = self.field_pages.get(name)
+            if page_number is not None:
+                values_by_page[page_number][name] = value
+        for page_number, values in values_by_page.items():
+            writer.update_page_form_field_values(writer.pages[page_number], values)
+        return writer
+
+
+def build_1040_field_values(wages: float, nec_income: float, interest_income: float,
+                            federal_withheld: float, total_income: float,
+                            tax_no_credits: float, tax_owed: float, refund_or_due: float,
+                            filing_status: str, dependent_children: int, other_dependents: int,
+                            tax_year: int = DEFAULT_TAX_YEAR) -> Dict[str, str]:
+    # Calculate values
+    rules = tax_rules.get(tax_year)
+    standard_deduction = rules.standard_deductions.get(filing_status, rules.standard_deductions['single'])
+    taxable_income = max(total_income - standard_deduction, 0)
+    total_credits = (dependent_children * rules.child_tax_credit) + (other_dependents * rules.other_dependent_credit)
+
+    # Field mappings - using the actual field names from your template
+    field_values = {
+        # Page 1 - Income
+        'f1_32[0]': f"{wages:.2f}",                # Wages (line 1a)
+        'f1_43[0]': f"{interest_income:.2f}",      # Taxable interest (line 2b)
+        'f1_53[0]': f"{nec_income:.2f}",           # Nonemployee Compensation (line 8)
+        'f1_54[0]': f"{total_income:.2f}",         # Total income (line 9)
+        'f1_57[0]': f"{standard_deduction:.2f}",   # Standard deduction (line 12)
+        'f1_59[0]': f"{standard_deduction:.2f}",   # Standard deduction (line 14)
+        'f1_60[0]': f"{taxable_income:.2f}",       # Taxable income (line 15)
+
+        # Page 2 - Tax
+        'f2_02[0]': f"{tax_no_credits:.2f}",       # Tax (line 16)
+        'f2_04[0]': f"{tax_no_credits:.2f}",       # Total tax (line 18)
+        'f2_05[0]': f"{total_credits:.2f}",        # Credits (line 19)
+        'f2_07[0]': f"{total_credits:.2f}",        # Total Credits (line 21)
+        'f2_10[0]': f"{tax_owed:.2f}",             # Total tax (line 24)
+
+        # Payments
+        'f2_11[0]': f"{federal_withheld:.2f}",     # Federal withheld (line 25a)
+        'f2_14[0]': f"{federal_withheld:.2f}",     # Total Federal withheld (line 25d)
+        'f2_22[0]': f"{federal_withheld:.2f}",     # Total payments (line 33)
+    }
+
+    # Handle refund/amount due
+    if refund_or_due >= 0:
+        field_values.update({
+            'f2_23[0]': f"{refund_or_due:.2f}",   # Amount overpaid (line 34)
+            'f2_24[0]': f"{refund_or_due:.2f}"    # Refund amount (line 35a)
+        })
+    else:
+        field_values.update({
+            'f2_28[0]': f"{-refund_or_due:.2f}",  # Amount due (line 37)
+            'f2_29[0]': f"{-refund_or_due:.2f}"   # Amount you owe (line 38)
+        })
+
+    return field_values
+
+
+_form_1040_template: Optional[PdfFormTemplate] = None
+_template_lock = threading.Lock()
+
+
+def get_1040_template() -> PdfFormTemplate:
+    """The 1040 template, parsed on first use (or by the startup prewarm) and shared by every fill."""
+    global _form_1040_template
+    if _form_1040_template is None:
+        with _template_lock:
+            if _form_1040_template is None:
+                _form_1040_template = PdfFormTemplate(TEMPLATE_PATH)
+    return _form_1040_template
@@ -0,0 +1,142 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+@dataclass(frozen=True)
+class BoxRegion:
+    """Where a box value is printed relative to its label, in PDF points (used by layout extraction)."""
+    field: str
+    label: str                                # Label words printed in the box, e.g. "Wages, tips"
+    left: float = -24.0                       # Region edges, relative to the label's left and bottom edges
+    right: float = 150.0
+    top: float = -2.0
+    bottom: float = 30.0
+
+
+@dataclass(frozen=True)
+class FormSpec:
+    """How one form type is recognized and where its box values sit relative to a label line."""
+    form_type: str                            # Reported document type, also used in error messages
+    anchors: Tuple[str, ...]                  # Any of these in the text identifies the form
+    label_markers: Tuple[str, ...]            # The first line containing one of these is the label line
+    fields: Tuple[str, ...]                   # Box values, in the order they appear on the values line
+    value_line_offset: int = 1                # Values line, relative to the label line
+    after_token: Optional[str] = None         # Only tokens after this one are considered
+    exclude_chars: Tuple[str, ...] = ('-',)   # Tokens containing any of these are skipped (EIN, SSN, '$')
+    numeric_only: bool = False                # Keep only tokens made of digits and at most two dots
+    drop_last_of: Tuple[str, ...] = ()        # Remove the last token equal to one of these (e.g. a tax year)
+    boxes: Tuple[BoxRegion, ...] = ()         # Box regions of each field, for layout extraction
+
+
+#Supported forms, highest classification priority first; a new form is one more entry here
+FORM_SPECS = (
+    FormSpec(
+        form_type="W-2",
+        anchors=("W-2", "Wage and Tax Statement"),
+        label_markers=("Employer identification", "Wages, tips", "Federal income tax"),
+        fields=("wages", "federal_income_tax_withheld"),
+        boxes=(
+            BoxRegion("wages", "Wages, tips"),
+            BoxRegion("federal_income_tax_withheld", "Federal income tax withheld")
+        )
+    ),
+    FormSpec(
+        form_type="1099-NEC",
+        anchors=("NEC", "Nonemployee Compensation"),
+        label_markers=("Copy",),
+        fields=("nonemployee_compensation",),
+        exclude_chars=('-', '$'),
+        boxes=(BoxRegion("nonemployee_compensation", "Nonemployee compensation"),)
+    ),
+    FormSpec(
+        form_type="1099-INT",
+        anchors=("INT", "Interest Income"),
+        label_markers=("$",),
+        fields=("interest_income",),
+        value_line_offset=0,
+        after_token="$",
+        numeric_only=True,
+        drop_last_of=("20", "2024", "2025"),
+        boxes=(BoxRegion("interest_income", "Interest income"),)
+    ),
+)
+
+UNKNOWN_FORM_ERROR = "Please upload a W-2, 1099-NEC, or a 1099-INT form"
+
+
+class FormParser:
+    """Classifies a document and extracts its box values as described by a list of form specs."""
+
+    def __init__(self, specs: Sequence[FormSpec] = FORM_SPECS):
+        self.specs = tuple(specs)
+        self.by_type = {spec.form_type: spec for spec in self.specs}
+
+    def classify(self, text: str) -> Optional[FormSpec]:
+        """Highest-priority spec with an anchor anywhere in the text."""
+        # Plain substring tests run CPython's fast search in C and stop at the first spec that
+        # matches; a combined regex over all anchors measured several times slower here
+        for spec in self.specs:
+            for anchor in spec.anchors:
+                if anchor in text:
+                    return spec
+        return None
+
+    @staticmethod
+    def _find_label_line(spec: FormSpec, lines: List[str]) -> Optional[int]:
+        for i, line in enumerate(lines):
+            for marker in spec.label_markers:
+                if marker in line:
+                    return i
+        return None
+
+    def extract(self, spec: FormSpec, text: str) -> Tuple[Optional[List[float]], Optional[str]]:
+        """Box values of spec's fields, or an error message."""
+        if not text:
+            return None, "Empty document"
+
+        lines = [line.strip() for line in text.split('\n') if line.strip()]
+
+        # Find the line containing the labels
+        label_line = self._find_label_line(spec, lines)
+        if label_line is None or label_line + 1 >= len(lines):
+            return None, f"Could not find {spec.form_type} data labels"
+
+        parts = lines[label_line + spec.value_line_offset].split()
+        if spec.after_token is not None:
+            parts = parts[parts.index(spec.after_token) + 1:] if spec.after_token in parts else []
+
+        numbers = [part for part in parts if not any(char in part for char in spec.exclude_chars)]
+        if spec.numeric_only:
+            numbers = [part for part in numbers if part.replace('.', '', 2).isdigit()]
+        if spec.drop_last_of:
+            last_index = next((i for i in range(len(numbers) - 1, -1, -1) if numbers[i] in spec.drop_last_of), None)
+            if last_index is not None:
+                numbers.pop(last_index)
+
+        expected = len(spec.fields)
+        if len(numbers) != expected:
+            noun = "number" if expected == 1 else "numbers"
+            return None, f"Missing values in {spec.form_type} form (expected {expected} {noun}, found {len(numbers)})"
+
+        try:
+            return [float(number) for number in numbers], None
+        except ValueError:
+            return None, f"Invalid number format in {spec.form_type} values"
+
+    def parse(self, text: str) -> Dict[str, Any]:
+        """Classify the document and extract its values."""
+        if not text:
+            return {"type": "unknown", "error": "Empty document"}
+
+        spec = self.classify(text)
+        if spec is None:
+            return {"type": "unknown", "error": UNKNOWN_FORM_ERROR, "data": None}
+
+        values, error = self.extract(spec, text)
+        if error:
+            return {"type": spec.form_type, "error": error}
+        return {"type": spec.form_type, "data": dict(zip(spec.fields, values))}
+
+
+# Parser over the supported forms, shared by the Flask app
+form_parser = FormParser()
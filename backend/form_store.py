@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from data_store import TAX_STORE_BACKEND, TAX_STORE_PATH, SQLiteDatabase
+
+# How long a rendered 1040 stays downloadable
+FORM_TTL_SECONDS = int(os.environ.get("FORM_TTL_SECONDS", 3600))
+
+
+@dataclass(frozen=True)
+class RenderedForm:
+    form_id: str
+    session_id: str
+    data: bytes
+    etag: str
+    created_at: float
+    # fields_hash() of the 1040 field values the form was filled with
+    fields_hash: str = ""
+
+
+def fields_hash(field_values: Dict[str, str]) -> str:
+    """Digest of a form's field values, stored with the rendered PDF to tell whether it can be reused."""
+    return hashlib.sha256(json.dumps(field_values, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class RenderedFormStore:
+    """Filled 1040 PDFs kept in memory under a per-return ID until their TTL runs out."""
+
+    def __init__(self, ttl: int = FORM_TTL_SECONDS):
+        self.ttl = ttl
+        self._forms: Dict[str, RenderedForm] = {}
+        self._latest: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def put(self, session_id: str, data: bytes, fields_hash: str = "") -> RenderedForm:
+        # The ETag is the content hash, so re-rendering identical values keeps browser caches valid
+        form = RenderedForm(
+            form_id=uuid.uuid4().hex,
+            session_id=session_id,
+            data=data,
+            etag=hashlib.sha256(data).hexdigest(),
+            created_at=time.time(),
+            fields_hash=fields_hash
+        )
+        with self._lock:
+            self._evict_expired()
+            previous_id = self._latest.get(session_id)
+            if previous_id is not None:
+                self._forms.pop(previous_id, None)
+            self._forms[form.form_id] = form
+            self._latest[session_id] = form.form_id
+        return form
+
+    def get(self, form_id: str) -> Optional[RenderedForm]:
+        with self._lock:
+            form = self._forms.get(form_id)
+        if form is None or form.created_at < time.time() - self.ttl:
+            return None
+        return form
+
+    def latest(self, session_id: str, fields_hash: Optional[str] = None) -> Optional[RenderedForm]:
+        """The session's latest form; with fields_hash, only if it was filled with those field values."""
+        with self._lock:
+            form_id = self._latest.get(session_id)
+        form = self.get(form_id) if form_id else None
+        if form is None or (fields_hash is not None and form.fields_hash != fields_hash):
+            return None
+        return form
+
+    def discard_session(self, session_id: str):
+        with self._lock:
+            form_id = self._latest.pop(session_id, None)
+            if form_id is not None:
+                self._forms.pop(form_id, None)
+
+    def _evict_expired(self):
+        # Caller holds the lock
+        cutoff = time.time() - self.ttl
+        for form_id in [form_id for form_id, form in self._forms.items() if form.created_at < cutoff]:
+            form = self._forms.pop(form_id)
+            if self._latest.get(form.session_id) == form_id:
+                del self._latest[form.session_id]
+
+
+class SQLiteFormStore(SQLiteDatabase):
+    """Filled 1040 PDFs in the shared SQLite store, so every worker process can serve them."""
+
+    def __init__(self, path: str = TAX_STORE_PATH, ttl: int = FORM_TTL_SECONDS):
+        self.ttl = ttl
+        super().__init__(path, """
+            CREATE TABLE IF NOT EXISTS rendered_forms (
+                form_id TEXT PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                data BLOB NOT NULL,
+                etag TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                fields_hash TEXT NOT NULL DEFAULT ''
+            );
+            CREATE INDEX IF NOT EXISTS rendered_forms_session ON rendered_forms (session_id, created_at);
+        """)
+
+    def put(self, session_id: str, data: bytes, fields_hash: str = "") -> RenderedForm:
+        form = RenderedForm(
+            form_id=uuid.uuid4().hex,
+            session_id=session_id,
+            data=data,
+            etag=hashlib.sha256(data).hexdigest(),
+            created_at=time.time(),
+            fields_hash=fields_hash
+        )
+        with self._transaction() as conn:
+            # Only the session's latest form is kept, as in memory
+            conn.execute("DELETE FROM rendered_forms WHERE session_id = ? OR created_at < ?",
+                         (session_id, form.created_at - self.ttl))
+            conn.execute(
+                "INSERT INTO rendered_forms (form_id, session_id, data, etag, created_at, fields_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (form.form_id, form.session_id, form.data, form.etag, form.created_at, form.fields_hash)
+            )
+        return form
+
+    def _select(self, where: str, key: str) -> Optional[RenderedForm]:
+        row = self._connection().execute(
+            "SELECT form_id, session_id, data, etag, created_at, fields_hash FROM rendered_forms "
+            f"WHERE {where} = ? AND created_at >= ? ORDER BY created_at DESC LIMIT 1",
+            (key, time.time() - self.ttl)
+        ).fetchone()
+        return RenderedForm(row[0], row[1], bytes(row[2]), row[3], row[4], row[5]) if row else None
+
+    def get(self, form_id: str) -> Optional[RenderedForm]:
+        return self._select('form_id', form_id)
+
+    def latest(self, session_id: str, fields_hash: Optional[str] = None) -> Optional[RenderedForm]:
+        # Whichever worker rendered the session's latest form, it's reused only for the same field values
+        form = self._select('session_id', session_id)
+        if form is None or (fields_hash is not None and form.fields_hash != fields_hash):
+            return None
+        return form
+
+    def discard_session(self, session_id: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM rendered_forms WHERE session_id = ?", (session_id,))
+
+
+def create_form_store(backend: str = TAX_STORE_BACKEND):
+    # Forms are shared between worker processes whenever the session data is
+    return SQLiteFormStore() if backend == 'sqlite' else RenderedFormStore()
+
+
+# Shared store used by the Flask app
+rendered_forms = create_form_store()
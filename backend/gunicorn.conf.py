@@ -0,0 +1,63 @@
+"""Gunicorn settings for the backend: gunicorn -c gunicorn.conf.py wsgi:app
+
+Each worker process serves requests on a pool of threads, which mostly wait on network and disk.
+CPU-bound work runs outside them: uploads are extracted by the job queue (UPLOAD_WORKERS threads)
+with OCR on a process pool (OCR_WORKERS), and bulk 1040s are filled on another process pool.
+
+With more than one worker, session data, job status, filled forms and the uploaded-file list move
+to the sqlite store, so a client's requests can land on any worker, and each worker publishes its
+metrics to METRICS_DIR so /metrics reports the whole server.
+"""
+import os
+import sys
+
+# Request threads per worker process, and the worker processes themselves
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", 1))
+WEB_THREADS = int(os.environ.get("WEB_THREADS", 8))
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
+workers = WEB_WORKERS
+worker_class = "gthread"
+threads = WEB_THREADS
+
+# A single synchronous /upload?wait=... can spend a while in OCR
+timeout = int(os.environ.get("WEB_TIMEOUT", 120))
+# Time a stopping worker gets to finish its requests and drain its upload jobs
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", 90))
+keepalive = 5
+
+# Header limits; the body limit is MAX_REQUEST_BYTES, enforced by the app
+limit_request_line = 8190
+limit_request_fields = 100
+limit_request_field_size = 8190
+
+# Share the CPUs between the workers' process pools instead of giving each worker all of them
+cpus = os.cpu_count() or 1
+os.environ.setdefault("OCR_WORKERS", str(max(1, min(4, cpus // WEB_WORKERS))))
+os.environ.setdefault("BULK_FORM_WORKERS", str(max(1, cpus // WEB_WORKERS)))
+
+# Session data, job status and filled forms have to be shared between worker processes, and
+# /metrics has to add up every worker's counters whichever worker is scraped
+if WEB_WORKERS > 1:
+    os.environ.setdefault("TAX_STORE_BACKEND", "sqlite")
+    os.environ.setdefault("METRICS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics"))
+
+# Access log destination; empty disables it
+accesslog = os.environ.get("WEB_ACCESS_LOG", "-") or None
+
+
+def on_starting(server):
+    # Start counting from zero: drop the metrics published by the workers of an earlier run
+    metrics_dir = os.environ.get("METRICS_DIR")
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for filename in os.listdir(metrics_dir):
+            if filename.endswith((".json", ".tmp")):
+                os.remove(os.path.join(metrics_dir, filename))
+
+
+def worker_exit(server, worker):
+    # Runs in the worker once it has stopped taking requests (SIGTERM, max_requests, reload)
+    app_module = sys.modules.get("wsgi")
+    if app_module is not None:
+        app_module.drain()
+        server.log.info("Worker %s drained its upload jobs", worker.pid)
@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from data_store import TAX_STORE_BACKEND, TAX_STORE_PATH, SQLiteDatabase
+
+# Number of uploads processed concurrently (OCR inside each job runs on the OCR process pool)
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", 4))
+
+# How long finished jobs stay available for polling
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", 3600))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+@dataclass
+class Job:
+    id: str
+    filename: str
+    session_id: str
+    status: str = QUEUED
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    cancelled: bool = False
+    # Set once the job has finished, for callers that wait on it instead of polling
+    done: threading.Event = field(default_factory=threading.Event, repr=False, compare=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.id,
+            'session_id': self.session_id,
+            'filename': self.filename,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+
+
+class SQLiteJobRecords(SQLiteDatabase):
+    """Status of every worker process's jobs in the shared SQLite store, so any of them can answer a poll."""
+
+    def __init__(self, path: str = TAX_STORE_PATH):
+        super().__init__(path, """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                finished INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                finished_at REAL,
+                job TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_session ON jobs (session_id, finished);
+        """)
+
+    def save(self, job: Job):
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, session_id, finished, created_at, finished_at, job) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job.id, job.session_id, job.finished, job.created_at, job.finished_at, json.dumps(job.to_dict()))
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute("SELECT job FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def pending_count(self, session_id: str, since: float) -> int:
+        # Jobs older than the TTL don't count, in case the process running them died
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM jobs WHERE session_id = ? AND NOT finished AND created_at >= ?",
+            (session_id, since)
+        ).fetchone()[0]
+
+    def prune(self, cutoff: float):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM jobs WHERE created_at < ? AND (finished_at IS NULL OR finished_at < ?)",
+                         (cutoff, cutoff))
+
+
+def create_job_records(backend: str = TAX_STORE_BACKEND) -> Optional[SQLiteJobRecords]:
+    # Job status only needs sharing when the session data is shared between processes
+    return SQLiteJobRecords() if backend == 'sqlite' else None
+
+
+class JobQueue:
+    """Background queue for document processing, polled by job ID.
+
+    Jobs run in this process; with `records`, their status is also published there for other processes.
+    """
+
+    def __init__(self, workers: int = UPLOAD_WORKERS, ttl: int = JOB_TTL_SECONDS,
+                 records: Optional[SQLiteJobRecords] = None):
+        self.ttl = ttl
+        self.records = records
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="upload-job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, session_id: str, filename: str, func: Callable[..., Dict[str, Any]], *args) -> Job:
+        """Queue func(job, *args); its return value becomes the job result."""
+        job = Job(id=uuid.uuid4().hex, filename=filename, session_id=session_id)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._publish(job)
+        self._executor.submit(self._run, job, func, args)
+        return job
+
+    def _run(self, job: Job, func, args):
+        if job.cancelled:
+            job.done.set()
+            return
+        job.status = RUNNING
+        self._publish(job)
+        try:
+            job.result = func(job, *args)
+            job.status = CANCELLED if job.cancelled else DONE
+        except Exception as e:
+            print(f"Upload job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            self._publish(job)
+            job.done.set()
+
+    def _publish(self, job: Job):
+        if self.records is not None:
+            try:
+                self.records.save(job)
+            except Exception as e:
+                print(f"Saving status of upload job {job.id} failed: {e}")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A job as a dict, whether it was submitted to this process or, with shared records, another one."""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return self.records.get(job_id) if self.records is not None else None
+
+    def pending_count(self, session_id: str) -> int:
+        if self.records is not None:
+            return self.records.pending_count(session_id, time.time() - self.ttl)
+        with self._lock:
+            return sum(1 for job in self._jobs.values()
+                       if job.session_id == session_id and not job.finished)
+
+    def wait(self, jobs: Iterable[Job], timeout: float) -> bool:
+        """Block until every job has finished or timeout seconds have passed; True if all finished."""
+        deadline = time.monotonic() + timeout
+        for job in jobs:
+            if not job.done.wait(max(0.0, deadline - time.monotonic())):
+                return False
+        return True
+
+    def cancel_session(self, session_id: str, filename: Optional[str] = None):
+        """Mark the session's unfinished jobs (only those of filename, if given) as cancelled so their results are discarded.
+
+        Jobs running in other processes aren't reached, but the data store discards their results as well.
+        """
+        cancelled = []
+        with self._lock:
+            for job in self._jobs.values():
+                if job.session_id == session_id and not job.finished and filename in (None, job.filename):
+                    job.cancelled = True
+                    if job.status == QUEUED:
+                        job.status = CANCELLED
+                        job.finished_at = time.time()
+                        job.done.set()
+                        cancelled.append(job)
+        for job in cancelled:
+            self._publish(job)
+
+    def _prune(self):
+        # Caller holds the lock
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self.records is not None:
+            self.records.prune(cutoff)
+
+    def shutdown(self, wait: bool = True):
+        # With wait=True, queued jobs still run; that's how a stopping worker drains its uploads
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,111 @@
+import re
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from form_specs import BoxRegion, FormSpec
+
+# Grid cell size in PDF points; a little larger than a typical form box
+GRID_CELL = 48.0
+
+# A box amount: optional '$', digits with optional thousands separators, optional decimals
+AMOUNT_PATTERN = re.compile(r'^\$?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?$')
+
+# PyMuPDF word tuple: (x0, y0, x1, y1, text, block_no, line_no, word_no)
+Word = Tuple[float, float, float, float, str, int, int, int]
+Rect = Tuple[float, float, float, float]
+
+
+def _label_token(text: str) -> str:
+    # "Wages," on the form matches "Wages" in a label
+    return text.rstrip(',:;.')
+
+
+#Rebuild text lines from PyMuPDF word boxes, grouping words whose tops are within y_tolerance
+def words_to_lines(words, y_tolerance=3):
+    lines = []
+    current = []
+    current_top = None
+    for word in sorted(words, key=lambda w: (w[1], w[0])):
+        if current and word[1] - current_top > y_tolerance:
+            lines.append(current)
+            current = []
+        if not current:
+            current_top = word[1]
+        current.append(word)
+    if current:
+        lines.append(current)
+    return "\n".join(" ".join(w[4] for w in sorted(line, key=lambda w: w[0])) for line in lines)
+
+
+class PageLayout:
+    """Word boxes of one page, indexed by position (uniform grid) and by text (for label lookup)."""
+
+    def __init__(self, words: Sequence[Word], cell: float = GRID_CELL):
+        self.words = list(words)
+        self.cell = cell
+        self._grid: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self._by_text: Dict[str, List[int]] = defaultdict(list)
+        for i, word in enumerate(self.words):
+            center_x = (word[0] + word[2]) / 2
+            center_y = (word[1] + word[3]) / 2
+            self._grid[(int(center_x // cell), int(center_y // cell))].append(i)
+            self._by_text[_label_token(word[4])].append(i)
+
+    def text(self) -> str:
+        return words_to_lines(self.words)
+
+    def query(self, rect: Rect) -> List[Word]:
+        """Words whose center lies inside rect, top to bottom, then left to right."""
+        x0, y0, x1, y1 = rect
+        found = []
+        for grid_x in range(int(x0 // self.cell), int(x1 // self.cell) + 1):
+            for grid_y in range(int(y0 // self.cell), int(y1 // self.cell) + 1):
+                for i in self._grid.get((grid_x, grid_y), ()):
+                    word = self.words[i]
+                    center_x = (word[0] + word[2]) / 2
+                    center_y = (word[1] + word[3]) / 2
+                    if x0 <= center_x <= x1 and y0 <= center_y <= y1:
+                        found.append(word)
+        found.sort(key=lambda w: (w[1], w[0]))
+        return found
+
+    def find_label(self, label: str) -> List[Rect]:
+        """Bounding boxes of every occurrence of the label's words, consecutive on one text line."""
+        tokens = [_label_token(token) for token in label.split()]
+        rects = []
+        for start in self._by_text.get(tokens[0], ()):
+            first = self.words[start]
+            matched = self.words[start:start + len(tokens)]
+            if len(matched) == len(tokens) and all(
+                    _label_token(word[4]) == token and word[5:7] == first[5:7]
+                    for word, token in zip(matched, tokens)):
+                rects.append((min(w[0] for w in matched), min(w[1] for w in matched),
+                              max(w[2] for w in matched), max(w[3] for w in matched)))
+        return rects
+
+    def read_box(self, box: BoxRegion, reread: Optional[Callable[[Rect], str]] = None) -> Optional[float]:
+        # The first amount inside the region below any occurrence of the label. For OCRed pages,
+        # reread(rect) reads a candidate word's box again with a numeric-only OCR pass
+        for label_x0, _, _, label_y1 in self.find_label(box.label):
+            region = (label_x0 + box.left, label_y1 + box.top, label_x0 + box.right, label_y1 + box.bottom)
+            for word in self.query(region):
+                token = word[4]
+                if '-' in token:
+                    continue
+                if reread is not None and any(char.isdigit() for char in token):
+                    token = reread(word[:4]) or token
+                if AMOUNT_PATTERN.match(token):
+                    return float(token.lstrip('$').replace(',', ''))
+        return None
+
+    def read_boxes(self, spec: FormSpec, reread: Optional[Callable[[Rect], str]] = None) -> Optional[Dict[str, float]]:
+        """Values of all of spec's boxes, or None if any box can't be located on this page."""
+        if not spec.boxes:
+            return None
+        values = {}
+        for box in spec.boxes:
+            value = self.read_box(box, reread)
+            if value is None:
+                return None
+            values[box.field] = value
+        return values
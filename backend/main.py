@@ -1,19 +1,36 @@
 import os
-import shutil
-import pdfplumber
-import pytesseract
-from PIL import Image
 import io
-import fitz
-from flask import Flask, request, jsonify, send_file
+import re
+import hashlib
+import time
+import shutil
+import threading
+from flask import Flask, Request, Response, request, jsonify, g
 from werkzeug.utils import secure_filename
 from pathlib import Path
 from flask_cors import CORS
-from dataclasses import dataclass
-from typing import List, Tuple
-from PyPDF2 import PdfReader, PdfWriter
+from jobs import JobQueue, create_job_records
+from upload_store import upload_index, receive_upload, start_upload_gc, CappedUploadFile, UploadTooLarge
+from data_store import tax_data_store
+from tax_rules import tax_rules, TaxRulesError, DEFAULT_TAX_YEAR, FILING_STATUSES
+from form_specs import form_parser
+from extraction import document_totals, extract_document
+from form_filler import get_1040_template, build_1040_field_values
+from form_store import rendered_forms, fields_hash
+from bulk_forms import BULK_FORM_MAX_RECORDS, bulk_renderer, complete_returns, stream_archive
+from tax_batch import TAX_BATCH_MAX_RECORDS, BatchTooLarge, read_batch_records, records_to_columns, stream_csv, stream_ndjson
+from tax_graph import return_graphs
+from tax_scenarios import SCENARIO_AMOUNT_FIELDS, read_sweep, sweep_scenarios
+from metrics import registry, REQUEST_SECONDS, STAGE_SECONDS, FORM_RENDERS
+
+class UploadRequest(Request):
+    # Each uploaded file is spooled with MAX_UPLOAD_BYTES enforced as werkzeug parses the body, so an
+    # oversized PDF stops being stored as soon as it passes the limit
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return CappedUploadFile()
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 CORS(app)
 
 # Get the directory where app.py is located
@@ -23,34 +40,91 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-# Set outputs directory
-OUTPUTS_FOLDER = os.path.join(BASE_DIR, 'outputs')
+# Largest request body accepted (all files of one /upload together); larger requests get a 413
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get("MAX_REQUEST_BYTES", 100 * 1024 * 1024))
+
+# Longest /upload?wait=<seconds> may hold a request thread while its documents are processed
+UPLOAD_MAX_WAIT_SECONDS = float(os.environ.get("UPLOAD_MAX_WAIT_SECONDS", 60))
+
+# Load the PDF/OCR libraries and the 1040 template on a background thread at startup, so the
+# app starts serving immediately and the first upload doesn't pay for them
+PREWARM = os.environ.get("PREWARM", "1").lower() not in ("0", "false", "no", "")
         
 Path(UPLOAD_FOLDER).mkdir(parents=True, exist_ok=True)
 
-# Clear uploads folder on startup
-if os.path.exists(UPLOAD_FOLDER):
-    shutil.rmtree(UPLOAD_FOLDER)
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Uploads left behind by earlier runs or expired sessions are removed in the background once they're
+# older than UPLOAD_MAX_AGE_SECONDS, instead of clearing the whole folder before the app can start;
+# a live session's files stay as long as its totals do
+start_upload_gc(UPLOAD_FOLDER, is_active=tax_data_store.is_active)
 
-# Clear outputs folder
-if os.path.exists(OUTPUTS_FOLDER):
-    shutil.rmtree(OUTPUTS_FOLDER)
-os.makedirs(OUTPUTS_FOLDER, exist_ok=True)
+def prewarm():
+    try:
+        import pdfplumber, fitz, numpy, pytesseract, PyPDF2
+        from PIL import Image
+        get_1040_template()
+    except Exception as e:
+        print(f"Prewarm failed: {e}")
+
+if PREWARM:
+    threading.Thread(target=prewarm, name="prewarm", daemon=True).start()
+
+#Every request belongs to a session (X-Session-ID header) so concurrent users keep separate returns
+DEFAULT_SESSION = 'default'
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+#How often expired sessions are looked for
+SESSION_EVICTION_INTERVAL = 60
+last_session_eviction = 0.0
+
+def session_upload_folder(session_id):
+    return os.path.join(UPLOAD_FOLDER, session_id)
+
+#Time every request; registered first so rejected requests are timed too
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.get('request_started')
+    if started is not None:
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+            status=response.status_code
+        )
+    return response
+
+@app.before_request
+def load_session():
+    global last_session_eviction
+    session_id = request.headers.get('X-Session-ID') or request.args.get('session_id') or DEFAULT_SESSION
+    if not SESSION_ID_PATTERN.match(session_id):
+        return jsonify({'error': 'Invalid session ID'}), 400
+    g.session_id = session_id
+
+    # Drop sessions past their TTL along with their uploads
+    now = time.time()
+    if now - last_session_eviction >= SESSION_EVICTION_INTERVAL:
+        last_session_eviction = now
+        for expired_id in tax_data_store.evict_expired():
+            upload_jobs.cancel_session(expired_id)
+            rendered_forms.discard_session(expired_id)
+            return_graphs.discard_session(expired_id)
+            upload_index.discard_session(expired_id)
+            shutil.rmtree(session_upload_folder(expired_id), ignore_errors=True)
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({'error': f"Request exceeds the {app.config['MAX_CONTENT_LENGTH']} byte limit"}), 413
 
 #Show Uploaded Files
 @app.route('/get-uploaded-files', methods=['GET'])
 def get_uploaded_files():
     try:
-        files = []
-        for filename in os.listdir(UPLOAD_FOLDER):
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            if os.path.isfile(filepath):
-                files.append({
-                    'name': filename,
-                    'size': os.path.getsize(filepath),
-                    'upload_time': os.path.getmtime(filepath)
-                })
+        # Served from the upload index rather than a directory scan
+        files = [record.to_dict() for record in upload_index.list(g.session_id)]
         return jsonify({'success': True, 'files': files})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -59,261 +133,73 @@ def get_uploaded_files():
 @app.route('/clear-uploads', methods=['POST'])
 def clear_uploads():
     try:
-        # CLear uploads folder
-        if os.path.exists(UPLOAD_FOLDER):
-            shutil.rmtree(UPLOAD_FOLDER)
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-        # Clear outputs folder
-        if os.path.exists(OUTPUTS_FOLDER):
-            shutil.rmtree(OUTPUTS_FOLDER)
-        os.makedirs(OUTPUTS_FOLDER, exist_ok=True)
-
-        # Reset the data storage
-        extracted_data_store["wages"] = 0.0
-        extracted_data_store["federal_withheld"] = 0.0
-        extracted_data_store["nec_income"] = 0.0
-        extracted_data_store["interest_income"] = 0.0
+        # CLear this session's uploads folder
+        shutil.rmtree(session_upload_folder(g.session_id), ignore_errors=True)
+        upload_index.discard_session(g.session_id)
+
+        # Drop this session's filled form
+        rendered_forms.discard_session(g.session_id)
+        return_graphs.discard_session(g.session_id)
+
+        # Discard in-flight uploads and reset the data storage
+        upload_jobs.cancel_session(g.session_id)
+        tax_data_store.reset(g.session_id)
 
         return jsonify({'success': True, 'message': 'Uploads folder cleared'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-#Extract text from scanned PDF using OCR
-def extract_text_with_ocr(pdf_path):
-    doc = fitz.open(pdf_path)
-    text = ""
-    for page in doc:
-        pix = page.get_pixmap()
-        img = Image.open(io.BytesIO(pix.tobytes()))
-        text += pytesseract.image_to_string(img) + "\n"
-    return text
-
-#Hybrid text extraction with fallback to OCR
-def extract_text_from_pdf(pdf_path):
-    try:
-        # First try regular text extraction
-        with pdfplumber.open(pdf_path) as pdf:
-            text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-        
-        # If we get less text (likely scanned PDF), try OCR
-        if len(text.strip()) < 50:
-            return extract_text_with_ocr(pdf_path)
-        return text
-    except Exception as e:
-        print(f"PDF text extraction failed: {e}")
-        return extract_text_with_ocr(pdf_path)
-
+#Box values of a single form type; the line rules live in form_specs.FORM_SPECS
 def extract_w2_values(text):
-    if not text:
-        return None, None, "Empty document"
-    
-    # Split text into lines
-    lines = [line.strip() for line in text.split('\n') if line.strip()]
-    
-    # Find the line containing the labels
-    label_line = None
-    for i, line in enumerate(lines):
-        if ("Employer identification" in line or 
-            "Wages, tips" in line or 
-            "Federal income tax" in line):
-            label_line = i
-            break
-    
-    if label_line is None or label_line + 1 >= len(lines):
-        return None, None, "Could not find W-2 data labels"
-    
-    # Get the next line after labels
-    values_line = lines[label_line + 1]
-    parts = values_line.split()
-    
-    # Filter out EIN (numbers with hyphens)
-    filtered_numbers = [part for part in parts if '-' not in part]
-    
-    # We need exactly 2 values remaining
-    if len(filtered_numbers) != 2:
-        return None, None, f"Missing values in W-2 form (expected 2 numbers, found {len(filtered_numbers)})"
-
-    try:
-        wages = float(filtered_numbers[0])
-        federal_tax = float(filtered_numbers[1])
-    except ValueError:
-        return None, None, "Invalid number format in W-2 values"
-    
-    print(f"Debug - Values line: {values_line}")
-    print(f"Debug - Filtered numbers: {filtered_numbers}")
-    print(f"Debug - Wages: {wages}, Federal Tax: {federal_tax}")
-    
+    values, error = form_parser.extract(form_parser.by_type["W-2"], text)
+    if error:
+        return None, None, error
+    wages, federal_tax = values
     return wages, federal_tax, None
 
 def extract_NEC(text):
-    if not text:
-        return None, "Empty document"
-    
-    # Split text into lines
-    lines = [line.strip() for line in text.split('\n') if line.strip()]
-    
-    # Find the line containing the labels
-    label_line = None
-    for i, line in enumerate(lines):
-        if ("Copy" in line):
-            label_line = i
-            break
-        
-    if label_line is None or label_line + 1 >= len(lines):
-        return None, "Could not find 1099-NEC data labels"
-    
-    # Get the next line after labels
-    values_line = lines[label_line + 1]
-    parts = values_line.split()
-    
-    # Filter out EIN and SSN (numbers with hyphens)
-    filtered_numbers = [part for part in parts if '-' not in part and '$' not in part]
-    
-    # We need exactly 1 value remaining
-    if len(filtered_numbers) != 1:
-        return None, f"Missing values in 1099-NEC form (expected 1 number, found {len(filtered_numbers)})"
-
-    try:
-        nec_income = float(filtered_numbers[0])
-    except ValueError:
-        return None, "Invalid number format in 1099-NEC values"
-
-    print(f"Debug - Values line: {values_line}")
-    print(f"Debug - Filtered numbers: {filtered_numbers}")
-    print(f"Debug - Nonemployee Compensation: {nec_income}")
-    
-    return nec_income, None
+    values, error = form_parser.extract(form_parser.by_type["1099-NEC"], text)
+    return (None, error) if error else (values[0], None)
 
 def extract_INT(text):
-    if not text:
-        return None, "Empty document"
-    
-    # Split text into lines
-    lines = [line.strip() for line in text.split('\n') if line.strip()]
-    
-    # Find the line containing the labels
-    label_line = None
-    for i, line in enumerate(lines):
-        if ("$" in line):
-            label_line = i
-            break
-        
-    if label_line is None or label_line + 1 >= len(lines):
-        return None, "Could not find 1099-INT data labels"
-    
-    # Get the next line after labels
-    values_line = lines[label_line]
-    parts = values_line.split()
-    
-    # Filter out everything before '$'
-    filtered_numbers = parts[parts.index('$') + 1:] if '$' in parts else []
-    
-    filtered_numbers = [
-        x for x in filtered_numbers
-        if str(x).replace('.', '', 2).isdigit()
-        and '-' not in str(x)  # Also exclude hyphenated numbers (like SSN/EIN)
-    ]
-
-    # List of values to check for
-    values_to_remove = ['20', '2024', '2025']
-
-    # Find the last occurrence of any of these values
-    last_index = None
-    for i in range(len(filtered_numbers)-1, -1, -1):
-        if filtered_numbers[i] in values_to_remove:
-            last_index = i
-            break
-
-    # Remove the last occurrence if found
-    if last_index is not None:
-        filtered_numbers.pop(last_index)
-    
-    # We need exactly 1 value remaining
-    if len(filtered_numbers) != 1:
-        return None, f"Missing values in 1099-INT form (expected 1 number, found {len(filtered_numbers)})"
-
-    try:
-        int_income = float(filtered_numbers[0])
-    except ValueError:
-        return None, "Invalid number format in 1099-INT values"
-
-    print(f"Debug - Values line: {values_line}")
-    print(f"Debug - Filtered numbers: {filtered_numbers}")
-    print(f"Debug - Interest Income: {int_income}")
-    
-    return int_income, None
+    values, error = form_parser.extract(form_parser.by_type["1099-INT"], text)
+    return (None, error) if error else (values[0], None)
     
-#Global storage for values needed for tax calculation
-extracted_data_store = {
-    "wages": 0.0,
-    "federal_withheld": 0.0,
-    "nec_income": 0.0,
-    "interest_income": 0.0
-}
-
 #Reset the values for tax calculation
 @app.route('/reset-data-store', methods=['POST'])
 def reset_data_store():
     try:
-        extracted_data_store["wages"] = 0.0
-        extracted_data_store["federal_withheld"] = 0.0
-        extracted_data_store["nec_income"] = 0.0
-        extracted_data_store["interest_income"] = 0.0
+        upload_jobs.cancel_session(g.session_id)
+        tax_data_store.reset(g.session_id)
         return jsonify({'success': True, 'message': 'Data store reset successfully'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def process_tax_document(text):
-    # Process document and extract values
-    if not text:
-        return {"type": "unknown", "error": "Empty document"}
+#Background queue that extracts and parses uploaded documents; with the sqlite store, job status is
+#shared so any worker process can answer /jobs/<job_id>
+upload_jobs = JobQueue(records=create_job_records())
 
-    # Check document type
-    if "W-2" in text or "Wage and Tax Statement" in text:
-        wages, federal_tax, error = extract_w2_values(text)
-        if error:
-            return {"type": "W-2", "error": error}
-            
-        extracted_data_store["wages"] += wages
-        extracted_data_store["federal_withheld"] += federal_tax
-        return {
-            "type": "W-2",
-            "data": {
-                "wages": wages,
-                "federal_income_tax_withheld": federal_tax
-            }
-        }
-    elif "NEC" in text or "Nonemployee Compensation" in text:
-        nec_income, error = extract_NEC(text)
-        if error:
-            return {"type": "1099-NEC", "error": error}
-            
-        extracted_data_store["nec_income"] += nec_income
-        return {
-            "type": "1099-NEC",
-            "data": {
-                "nonemployee_compensation": nec_income
-            }
-        }
-    elif "INT" in text or "Interest Income" in text:
-        int_income, error = extract_INT(text)
-        if error:
-            return {"type": "1099-INT", "error": error}
-            
-        extracted_data_store["interest_income"] += int_income
-        return {
-            "type": "1099-INT",
-            "data": {
-                "interest_income": int_income,
-            }
-        }
-    else:
-        return {
-            "type": "unknown", 
-            "error": "Please upload a W-2, 1099-NEC, or a 1099-INT form",
-            "data": None
-        }
+def process_upload(job, filepath, file_hash, generation):
+    # The saved file is read when the job runs, so queued uploads aren't held in memory
+    try:
+        with open(filepath, 'rb') as f:
+            pdf_bytes = f.read()
+    except FileNotFoundError:
+        # Removed before the job got to it
+        return None
+    if hashlib.sha256(pdf_bytes).hexdigest() != file_hash:
+        # Replaced by a newer upload under the same name, which has its own job
+        return None
+
+    # Repeat documents are served from the extraction cache and skip extraction entirely
+    document, cached = extract_document(pdf_bytes, file_hash)
+
+    # Enter the document in the session's ledger; discarded if the session was reset after `generation`,
+    # or the uploaded file was removed or replaced in the meantime
+    if job.cancelled or not tax_data_store.record_document(job.session_id, job.filename, file_hash, document["type"],
+                                                           document_totals(document), generation):
+        return None
+    return {**document, "cached": cached}
 
 @app.route('/upload', methods=['POST'])
 def upload_files():
@@ -324,15 +210,30 @@ def upload_files():
     if not files or all(file.filename == '' for file in files):
         return jsonify({'error': 'No selected files'}), 400
     
+    # With ?replace=1 a file named like an earlier upload replaces that document instead of being skipped
+    replace = request.args.get('replace', '').lower() in ('1', 'true')
+
+    # With ?wait=<seconds> the response carries the extraction results, so no /jobs polling is needed
+    wait = min(request.args.get('wait', 0, type=float), UPLOAD_MAX_WAIT_SECONDS)
+
     saved_files = []
+    submitted = []
+    upload_folder = session_upload_folder(g.session_id)
+    os.makedirs(upload_folder, exist_ok=True)
+
+    # Results of these uploads are discarded if the session is reset before they finish
+    generation = tax_data_store.get_generation(g.session_id)
     
     for file in files:
         if file:
             filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+            filepath = os.path.join(upload_folder, filename)
+
+            if replace:
+                remove_document(g.session_id, filename)
             
             # Check if file already exists (skip if true)
-            if os.path.exists(filepath):
+            if upload_index.contains(g.session_id, filename):
                 saved_files.append({
                     'original_name': filename,
                     'saved_name': filename,
@@ -342,37 +243,90 @@ def upload_files():
                 })
                 continue
 
-            file.save(filepath)
-            
-            # Extract text using hybrid approach
-            extracted_text = extract_text_from_pdf(filepath)
+            # Stream to disk in chunks, hashing on the way
+            try:
+                with STAGE_SECONDS.time(stage='save'):
+                    size, file_hash = receive_upload(file.stream, filepath)
+            except UploadTooLarge as e:
+                saved_files.append({
+                    'original_name': filename,
+                    'saved_name': filename,
+                    'status': 'rejected',
+                    'message': str(e)
+                })
+                continue
 
-            # Process the document
-            document_data = process_tax_document(extracted_text)
+            # Same document uploaded under another name
+            existing_name = tax_data_store.claim_upload(g.session_id, file_hash, filename)
+            if existing_name != filename:
+                os.remove(filepath)
+                saved_files.append({
+                    'original_name': filename,
+                    'saved_name': existing_name,
+                    'saved_path': os.path.join(upload_folder, existing_name),
+                    'status': 'skipped',
+                    'message': f'Same document already uploaded as {existing_name}'
+                })
+                continue
+            upload_index.add(g.session_id, filename, size, file_hash)
 
-            #Print to terminal for debugging
-            # print("\n" + "="*50)
-            # print(f"EXTRACTED TEXT FROM: {filename}")
-            # print("="*50)
-            # print(extracted_text)
-            # print("="*50 + "\n")
-            # print(personal_info_store)
+            # Extraction and parsing happen in the background, poll /jobs/<job_id> for the result
+            job = upload_jobs.submit(g.session_id, filename, process_upload, filepath, file_hash, generation)
+            submitted.append((len(saved_files), job))
 
             saved_files.append({
                 'original_name': filename,
                 'saved_name': filename,
                 'saved_path': filepath,
-                'status': 'processed',
-                **document_data
+                'status': 'queued',
+                'job_id': job.id
             })
+
+    # 200 once nothing is left processing, 202 while jobs are still queued or running
+    all_finished = not submitted
+    if wait > 0 and submitted:
+        all_finished = upload_jobs.wait([job for _, job in submitted], wait)
+        for index, job in submitted:
+            saved_files[index].update(status=job.status, result=job.result, error=job.error)
     
     return jsonify({
         'message': 'Files uploaded successfully',
         'files': saved_files
-    })
-
-#Storage for personal info such as filing status and number of dependents
-personal_info_store = {}
+    }), 200 if all_finished else 202
+
+def remove_document(session_id, filename):
+    # Take one document out of the session (in-flight job, ledger entry and its amounts, file on disk);
+    # the session's other documents and their extraction results are untouched
+    upload_jobs.cancel_session(session_id, filename)
+    removed = tax_data_store.remove_document(session_id, filename)
+    upload_index.remove(session_id, filename)
+    try:
+        os.remove(os.path.join(session_upload_folder(session_id), filename))
+        removed = True
+    except FileNotFoundError:
+        pass
+    return removed
+
+#The session's documents and the amounts each one contributes to the totals
+@app.route('/documents', methods=['GET'])
+def list_documents():
+    return jsonify({'success': True, 'documents': tax_data_store.list_documents(g.session_id)})
+
+#Remove a single uploaded document without resetting the others
+@app.route('/documents/<filename>', methods=['DELETE'])
+def delete_document(filename):
+    filename = secure_filename(filename)
+    if not filename or not remove_document(g.session_id, filename):
+        return jsonify({'error': 'Document not found'}), 404
+    return jsonify({'success': True, 'message': f'{filename} removed'})
+
+#Status and result of a queued upload
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = upload_jobs.status(job_id)
+    if job is None or job['session_id'] != g.session_id:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
 
 @app.route('/submit-personal-info', methods=['POST'])
 def submit_personal_info():
@@ -383,202 +337,90 @@ def submit_personal_info():
         return jsonify({'error': 'Missing required fields'}), 400
     
     try:
-        # Store in memory
-        personal_info_store.update({
+        # Store in the session's data store
+        info = {
             'filingStatus': data['filingStatus'],
             'dependentChildren': data['dependentChildren'],
             'otherDependents': data['otherDependents']
-        })
+        }
+        # Optional; returns without one are computed with DEFAULT_TAX_YEAR's rules
+        if data.get('taxYear') is not None:
+            info['taxYear'] = tax_rules.get(data['taxYear']).tax_year
+        personal_info = tax_data_store.set_personal_info(g.session_id, info)
         
-        print("Current stored personal info:", personal_info_store)
+        print("Current stored personal info:", personal_info)
         
         return jsonify({
             'message': 'Personal information saved',
-            'data': personal_info_store
+            'data': personal_info
         }), 200
+    except TaxRulesError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
-#Tax Logic
-@dataclass
-class TaxBracket:
-    lower: float
-    upper: float
-    rate: float
-
-#Tax Brackets from https://www.irs.gov/filing/federal-income-tax-rates-and-brackets
-class TaxBrackets2024:    
-    SINGLE = [
-        TaxBracket(0, 11600, 0.10),
-        TaxBracket(11601, 47150, 0.12),
-        TaxBracket(47151, 100525, 0.22),
-        TaxBracket(100526, 191950, 0.24),
-        TaxBracket(191951, 243725, 0.32),
-        TaxBracket(243726, 609350, 0.35),
-        TaxBracket(609351, float('inf'), 0.37)
-    ]
-    
-    MARRIED_JOINT = [
-        TaxBracket(0, 23200, 0.10),
-        TaxBracket(23201, 94300, 0.12),
-        TaxBracket(94301, 201050, 0.22),
-        TaxBracket(201051, 383900, 0.24),
-        TaxBracket(383901, 487450, 0.32),
-        TaxBracket(487451, 731200, 0.35),
-        TaxBracket(731201, float('inf'), 0.37)
-    ]
-    
-    MARRIED_SEPARATE = [
-        TaxBracket(0, 11600, 0.10),
-        TaxBracket(11601, 47150, 0.12),
-        TaxBracket(47151, 100525, 0.22),
-        TaxBracket(100526, 191950, 0.24),
-        TaxBracket(191951, 243725, 0.32),
-        TaxBracket(243726, 365600, 0.35),
-        TaxBracket(365601, float('inf'), 0.37)
-    ]
-    
-    HEAD_OF_HOUSEHOLD = [
-        TaxBracket(0, 16550, 0.10),
-        TaxBracket(16551, 63100, 0.12),
-        TaxBracket(63101, 100500, 0.22),
-        TaxBracket(100501, 191950, 0.24),
-        TaxBracket(191951, 243700, 0.32),
-        TaxBracket(243701, 609350, 0.35),
-        TaxBracket(609351, float('inf'), 0.37)
-    ]
-
-    @classmethod
-    def get_brackets(cls, filing_status: str) -> List[TaxBracket]:
-        status_map = {
-            'single': cls.SINGLE,
-            'married_joint': cls.MARRIED_JOINT,
-            'married_separate': cls.MARRIED_SEPARATE,
-            'head_of_household': cls.HEAD_OF_HOUSEHOLD,
-            'widow': cls.MARRIED_JOINT #Qualifying widows have the same tax bracket as married filiing jointly
-        }
-        return status_map[filing_status]
-    
-# Tax deductions based on filinig status
-STANDARD_DEDUCTIONS = {
-    'single': 14600,
-    'married_joint': 29200,
-    'married_separate': 14600,
-    'head_of_household': 21900,
-    'widow': 29200
-}
-
-CHILD_TAX_CREDIT = 2000
-OTHER_DEPENDENT_CREDIT = 500
-
-PHASE_OUT_THRESHOLDS = {
-    'single': 200000,
-    'married_joint': 400000,
-    'married_separate': 200000,
-    'head_of_household': 200000,
-    'widow': 400000
-}
-PHASE_OUT_RATE = 0.05
-
-def calculate_dependent_credits(filing_status: str, dependent_children: int, other_dependents: int, adjusted_gross_income: float):
-    # Calculate raw credits
-    child_credit = dependent_children * CHILD_TAX_CREDIT
-    other_credit = other_dependents * OTHER_DEPENDENT_CREDIT
-    total_raw_credit = child_credit + other_credit
-    
-    # Apply phase-out if income exceeds threshold
-    threshold = PHASE_OUT_THRESHOLDS[filing_status]
-    if adjusted_gross_income <= threshold:
-        return total_raw_credit
-    
-    excess_income = adjusted_gross_income - threshold
-    phase_out_amount = (excess_income // 1000) * 50
-    phased_out_credit = max(total_raw_credit - phase_out_amount, 0)
-    
-    print(f"Debug - Phase-out calculation:")
-    print(f"  AGI: {adjusted_gross_income}, Threshold: {threshold}")
-    print(f"  Excess: {excess_income}, Phase-out: {phase_out_amount}")
-    print(f"  Raw credit: {total_raw_credit}, Final credit: {phased_out_credit}")
-    
-    return phased_out_credit
-
-def calculate_tax(taxable_income: float, filing_status: str) -> float:
-    """Calculate tax based on taxable income and filing status."""
-    brackets = TaxBrackets2024.get_brackets(filing_status)
-    tax = 0.0
-
-    for bracket in brackets:
-        if taxable_income > bracket.lower:
-            bracket_amount = min(taxable_income, bracket.upper) - bracket.lower
-            tax += bracket_amount * bracket.rate
-        else:
-            break  # No more income to tax
-    
-    return tax
-
-def calculate_total_tax(total_income: float, filing_status: str, dependent_children: int = 0, other_dependents: int = 0) -> Tuple[float, float]:
-    """Calculate total tax including credits."""
-    # Calculate taxable income after standard deduction
-    standard_deduction = STANDARD_DEDUCTIONS[filing_status]
-    taxable_income = max(total_income - standard_deduction, 0)
-    
-    # Calculate tax before credits
-    tax_before_credits = calculate_tax(taxable_income, filing_status)
-    
-    # Calculate dependent credits with phase-out
-    dependent_credits = calculate_dependent_credits(
-        filing_status, 
-        dependent_children, 
-        other_dependents, 
-        total_income
-    )
-    
-    # Apply credits (can't reduce tax below zero)
-    final_tax = max(tax_before_credits - dependent_credits, 0)
-    
-    return tax_before_credits, final_tax, dependent_credits
-
 @app.route('/calculate-tax', methods=['GET'])
 def calculate_tax_endpoint():
     try:
         # Get income from all sources (initialize to 0 if missing)
-        wages = extracted_data_store.get("wages", 0.0)
-        nec_income = extracted_data_store.get("nec_income", 0.0)
-        interest_income = extracted_data_store.get("interest_income", 0.0)
-        total_income = wages + nec_income + interest_income
+        extracted_data = tax_data_store.get_totals(g.session_id)
         
+        personal_info_store = tax_data_store.get_personal_info(g.session_id)
         if not personal_info_store:
             return jsonify({'error': 'Personal information missing'}), 400
+
+        if upload_jobs.pending_count(g.session_id):
+            return jsonify({'error': 'Documents are still being processed'}), 409
+
+        # ?tax_year= overrides the year saved with the personal info
+        try:
+            rules = tax_rules.get(request.args.get('tax_year') or personal_info_store.get('taxYear'))
+        except TaxRulesError as e:
+            return jsonify({'error': str(e)}), 400
             
-        # Calculate tax
-        tax_no_credits, tax_owed, credits = calculate_total_tax(
-            total_income,
-            personal_info_store['filingStatus'],
-            personal_info_store['dependentChildren'],
-            personal_info_store['otherDependents']
-        )
-        
-        federal_withheld = extracted_data_store.get("federal_withheld", 0.0)
-        refund_or_due = federal_withheld - tax_owed
-        
-        # Generate filled 1040 form
-        filled_form_path = fill_1040_form(
-            wages=wages,
-            federal_withheld=federal_withheld,
-            nec_income = nec_income,
-            interest_income = interest_income,
-            total_income=total_income,
-            tax_no_credits = tax_no_credits,
-            tax_owed=tax_owed,
-            refund_or_due=refund_or_due,
-            filing_status=personal_info_store['filingStatus'],
-            dependent_children=personal_info_store['dependentChildren'],
-            other_dependents=personal_info_store['otherDependents']
-        )
+        # Only the lines downstream of an input that changed since the last calculation are recomputed
+        graph = return_graphs.get(g.session_id)
+        with graph.lock:
+            with STAGE_SECONDS.time(stage='calculate'):
+                graph.update(
+                    wages=extracted_data.get("wages", 0.0),
+                    nec_income=extracted_data.get("nec_income", 0.0),
+                    interest_income=extracted_data.get("interest_income", 0.0),
+                    federal_withheld=extracted_data.get("federal_withheld", 0.0),
+                    filing_status=personal_info_store['filingStatus'],
+                    dependent_children=personal_info_store['dependentChildren'],
+                    other_dependents=personal_info_store['otherDependents'],
+                    tax_year=rules.tax_year,
+                    rules=rules
+                )
+            lines = dict(graph.values)
+
+            # Generate filled 1040 form, kept in the form store under this return's session, unless the
+            # session's latest form (rendered by any worker) was filled with the same field values
+            field_values = graph.form_fields()
+            values_hash = fields_hash(field_values)
+            form = rendered_forms.latest(g.session_id, values_hash)
+            if form is not None:
+                FORM_RENDERS.inc(result='reused')
+            else:
+                with STAGE_SECONDS.time(stage='fill_form'):
+                    filled_form = render_1040_form(field_values)
+                form = rendered_forms.put(g.session_id, filled_form, values_hash) if filled_form else None
+                FORM_RENDERS.inc(result='rendered')
+
+        wages = lines['wages']
+        nec_income = lines['nec_income']
+        interest_income = lines['interest_income']
+        total_income = lines['total_income']
+        tax_owed = lines['tax_owed']
+        federal_withheld = lines['federal_withheld']
+        refund_or_due = lines['refund_or_due']
+        credits = lines['credits']
         
         return jsonify({
             'success': True,
             'results': {
+                'tax_year': rules.tax_year,
                 'total_income': total_income,
                 'tax_owed': tax_owed,
                 'federal_withheld': federal_withheld,
@@ -589,7 +431,8 @@ def calculate_tax_endpoint():
                     'nec_income': nec_income,
                     'interest_income': interest_income
                 },
-                'form_generated': bool(filled_form_path)
+                'form_generated': form is not None,
+                'form_url': f"/forms/{form.form_id}" if form else None
             }
         })
         
@@ -599,97 +442,157 @@ def calculate_tax_endpoint():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+#Tax, credits and refund for many returns at once, streamed back as NDJSON or CSV
+@app.route('/calculate-tax/batch', methods=['POST'])
+def calculate_tax_batch_endpoint():
+    try:
+        # Checked up front so an unknown year is a 400 rather than a broken stream
+        tax_year = tax_rules.get(request.args.get('tax_year')).tax_year
+        records = read_batch_records(request.get_data(), request.content_type, TAX_BATCH_MAX_RECORDS)
+        columns = records_to_columns(records)
+    except BatchTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if request.args.get('format') == 'csv' or 'text/csv' in request.headers.get('Accept', ''):
+        return Response(stream_csv(columns, tax_year), mimetype='text/csv')
+    return Response(stream_ndjson(columns, tax_year), mimetype='application/x-ndjson')
+
+#Refund or amount due of the session's return across a grid of what-if changes; no forms are filled.
+#Amount axes are added to the current amounts, filing status and dependent axes replace them, and
+#"base" overrides the current return before the sweep
+@app.route('/calculate-tax/scenarios', methods=['POST'])
+def calculate_tax_scenarios_endpoint():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object of axes to sweep'}), 400
+    if upload_jobs.pending_count(g.session_id):
+        return jsonify({'error': 'Documents are still being processed'}), 409
+
+    personal_info = tax_data_store.get_personal_info(g.session_id)
+    base = tax_data_store.get_totals(g.session_id)
+    base.update({
+        'filing_status': personal_info.get('filingStatus'),
+        'dependent_children': personal_info.get('dependentChildren', 0),
+        'other_dependents': personal_info.get('otherDependents', 0)
+    })
+    try:
+        base.update(data.get('base') or {})
+        tax_year = tax_rules.get(request.args.get('tax_year') or personal_info.get('taxYear')).tax_year
+        axes = read_sweep(data)
+        if base['filing_status'] not in FILING_STATUSES:
+            return jsonify({'error': 'Personal information missing'}), 400
+        for field in SCENARIO_AMOUNT_FIELDS:
+            base[field] = float(base.get(field) or 0)
+        with STAGE_SECONDS.time(stage='scenarios'):
+            result = sweep_scenarios(base, axes, tax_year)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'success': True, **result})
+
+#Tax years with rules available
+@app.route('/tax-years', methods=['GET'])
+def list_tax_years():
+    return jsonify({'default': DEFAULT_TAX_YEAR, 'tax_years': tax_rules.years()})
+
 def fill_1040_form(wages: float, nec_income: float, interest_income: float,
                    federal_withheld: float, total_income: float, 
                    tax_no_credits: float, tax_owed: float, refund_or_due: float, 
-                   filing_status: str, dependent_children: int, other_dependents: int):
+                   filing_status: str, dependent_children: int, other_dependents: int,
+                   tax_year: int = DEFAULT_TAX_YEAR):
     try:
-        # File paths
-        template_path = os.path.join(BASE_DIR, '1040_template.pdf')
-        output_path = os.path.join(OUTPUTS_FOLDER, 'filled_1040.pdf')
-        
-        # Read template
-        reader = PdfReader(template_path)
-        writer = PdfWriter()
-        
-        # Copy pages
-        for page in reader.pages:
-            writer.add_page(page)
-            
-        # Calculate values
-        standard_deduction = STANDARD_DEDUCTIONS.get(filing_status, 14600)
-        taxable_income = max(total_income - standard_deduction, 0)
-        total_credits = (dependent_children * CHILD_TAX_CREDIT) + (other_dependents * OTHER_DEPENDENT_CREDIT)
+        # Clone the pre-parsed template and fill only the pages holding these fields
+        field_values = build_1040_field_values(
+            wages=wages,
+            nec_income=nec_income,
+            interest_income=interest_income,
+            federal_withheld=federal_withheld,
+            total_income=total_income,
+            tax_no_credits=tax_no_credits,
+            tax_owed=tax_owed,
+            refund_or_due=refund_or_due,
+            filing_status=filing_status,
+            dependent_children=dependent_children,
+            other_dependents=other_dependents,
+            tax_year=tax_year
+        )
+        return render_1040_form(field_values)
         
-        # Field mappings - using the actual field names from your template
-        field_values = {
-            # Page 1 - Income
-            'f1_32[0]': f"{wages:.2f}",                # Wages (line 1a)
-            'f1_43[0]': f"{interest_income:.2f}",      # Taxable interest (line 2b)
-            'f1_53[0]': f"{nec_income:.2f}",           # Nonemployee Compensation (line 8)
-            'f1_54[0]': f"{total_income:.2f}",         # Total income (line 9)
-            'f1_57[0]': f"{standard_deduction:.2f}",   # Standard deduction (line 12)
-            'f1_59[0]': f"{standard_deduction:.2f}",   # Standard deduction (line 14)
-            'f1_60[0]': f"{taxable_income:.2f}",       # Taxable income (line 15)
-            
-            # Page 2 - Tax
-            'f2_02[0]': f"{tax_no_credits:.2f}",       # Tax (line 16)
-            'f2_04[0]': f"{tax_no_credits:.2f}",       # Total tax (line 18)
-            'f2_05[0]': f"{total_credits:.2f}",        # Credits (line 19)
-            'f2_07[0]': f"{total_credits:.2f}",        # Total Credits (line 21)
-            'f2_10[0]': f"{tax_owed:.2f}",             # Total tax (line 24)
-            
-            # Payments
-            'f2_11[0]': f"{federal_withheld:.2f}",     # Federal withheld (line 25a)
-            'f2_14[0]': f"{federal_withheld:.2f}",     # Total Federal withheld (line 25d)
-            'f2_22[0]': f"{federal_withheld:.2f}",     # Total payments (line 33)
-        }
-
-        # Handle refund/amount due
-        if refund_or_due >= 0:
-            field_values.update({
-                'f2_23[0]': f"{refund_or_due:.2f}",   # Amount overpaid (line 34)
-                'f2_24[0]': f"{refund_or_due:.2f}"    # Refund amount (line 35a)
-            })
-        else:
-            field_values.update({
-                'f2_28[0]': f"{-refund_or_due:.2f}",  # Amount due (line 37)
-                'f2_29[0]': f"{-refund_or_due:.2f}"   # Amount you owe (line 38)
-            })
+    except Exception as e:
+        print(f"Error filling 1040 form: {e}")
+        return None
 
-        # Update fields
-        for page in writer.pages:
-            writer.update_page_form_field_values(
-                page,
-                {k: v for k, v in field_values.items()}
-            )
+def render_1040_form(field_values):
+    try:
+        writer = get_1040_template().fill(field_values)
         
-        # Save filled form
-        with open(output_path, 'wb') as output_file:
-            writer.write(output_file)
-            
-        return output_path
+        # Render into memory; the PDF bytes are served straight from the form store
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        return buffer.getvalue()
         
     except Exception as e:
         print(f"Error filling 1040 form: {e}")
         return None
     
+def send_rendered_form(form):
+    # ETag/If-None-Match and Range requests are answered from the stored bytes
+    response = Response(form.data, mimetype='application/pdf')
+    response.set_etag(form.etag)
+    response.last_modified = form.created_at
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.accept_ranges = 'bytes'
+    response.headers['Content-Disposition'] = 'inline; filename=filled_1040.pdf'
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(form.data))
+
+@app.route('/forms/<form_id>', methods=['GET'])
+def serve_form(form_id):
+    form = rendered_forms.get(form_id)
+    if form is None:
+        return jsonify({'error': 'File not found'}), 404
+    return send_rendered_form(form)
+
+#Fill many computed returns at once, streamed back as one zip (default) or tar archive
+@app.route('/forms/bulk', methods=['POST'])
+def bulk_forms_endpoint():
+    try:
+        returns = read_batch_records(request.get_data(), request.content_type)
+        if len(returns) > BULK_FORM_MAX_RECORDS:
+            raise ValueError(f"{len(returns)} returns, more than the limit of {BULK_FORM_MAX_RECORDS} per request")
+        completed = complete_returns(returns)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    archive_format = 'tar' if request.args.get('format') == 'tar' else 'zip'
+    return Response(
+        stream_archive(bulk_renderer.render(completed), archive_format),
+        mimetype='application/x-tar' if archive_format == 'tar' else 'application/zip',
+        headers={'Content-Disposition': f'attachment; filename=filled_1040s.{archive_format}'}
+    )
+
+#Latest filled form of the session, kept at its original URL
 @app.route('/outputs/<filename>', methods=['GET'])
 def serve_output_file(filename):
     try:
         # Only allow access to specific files for security
         if filename != 'filled_1040.pdf':
             return jsonify({'error': 'File not found'}), 404
-            
-        filepath = os.path.join(OUTPUTS_FOLDER, filename)
-        
-        if not os.path.exists(filepath):
+
+        form = rendered_forms.latest(g.session_id)
+        if form is None:
             return jsonify({'error': 'File not found'}), 404
             
-        return send_file(filepath, as_attachment=False)
+        return send_rendered_form(form)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+#Prometheus scrape endpoint; numbers cover every worker when METRICS_DIR is set
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
 # Root Route    
 @app.route('/')
 def home():
@@ -698,7 +601,15 @@ def home():
         "service": "AI Tax Return Agent Backend",
         "endpoints": {
             "upload": "/upload",
-            "calculate": "/calculate-tax"
+            "jobs": "/jobs/<job_id>",
+            "documents": "/documents",
+            "calculate": "/calculate-tax",
+            "calculate_batch": "/calculate-tax/batch",
+            "calculate_scenarios": "/calculate-tax/scenarios",
+            "tax_years": "/tax-years",
+            "forms": "/forms/<form_id>",
+            "forms_bulk": "/forms/bulk",
+            "metrics": "/metrics"
         }
     })
 
@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+# Folder where every process publishes its metrics so /metrics can sum them over gunicorn workers;
+# unset, each process reports only its own
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+# Seconds between a process's writes to METRICS_DIR, i.e. how stale other workers' numbers can be
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", 5))
+
+# Latency buckets in seconds, from sub-millisecond parsing up to long OCR runs
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, one series per combination of label values."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, total: Dict[Tuple[str, ...], float], values: Dict[Tuple[str, ...], float]):
+        for key, value in values.items():
+            total[key] = total.get(key, 0) + value
+
+    def render(self, values: Dict[Tuple[str, ...], float] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted((self.snapshot() if values is None else values).items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Latency histogram; observe() touches a single bucket, cumulative counts are built on render."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per series: [count per bucket (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict[Tuple[str, ...], list]:
+        with self._lock:
+            return {key: [list(counts), total, count] for key, (counts, total, count) in self._series.items()}
+
+    def merge(self, total: Dict[Tuple[str, ...], list], series: Dict[Tuple[str, ...], list]):
+        for key, (counts, value_sum, count) in series.items():
+            if len(counts) != len(self.buckets) + 1:
+                continue                      # Written with other buckets, e.g. by an older version
+            merged = total.setdefault(key, [[0] * len(counts), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += value_sum
+            merged[2] += count
+
+    def render(self, series: Dict[Tuple[str, ...], list] = None) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted((self.snapshot() if series is None else series).items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, key, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in the Prometheus text format.
+
+    With a shared folder, each process writes a snapshot of its metrics there every few seconds and
+    render() sums the snapshots of every process, including ones that have exited, so counters
+    never go backwards when a worker is restarted.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._directory = None
+        self._path = None
+        self._pid = None
+        self._flush_lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def share(self, directory: str, interval: float = METRICS_FLUSH_SECONDS):
+        """Publish this process's metrics in `directory` and sum every process's in render()."""
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._pid = os.getpid()
+        # A fresh file per process start, so a new worker reusing a pid doesn't overwrite the old totals
+        self._path = os.path.join(directory, f"{self._pid}-{uuid.uuid4().hex[:8]}.json")
+        self.flush()
+        atexit.register(self.flush)
+        threading.Thread(target=self._flush_loop, args=(interval,), daemon=True, name="metrics-flush").start()
+
+    def _flush_loop(self, interval: float):
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+    def flush(self):
+        """Write this process's current metrics to the shared folder."""
+        # Forked children inherit the registry; only the process that called share() owns the file
+        if self._directory is None or os.getpid() != self._pid:
+            return
+        data = {metric.name: [[list(key), value] for key, value in metric.snapshot().items()]
+                for metric in self._metrics}
+        tmp_path = self._path + ".tmp"
+        with self._flush_lock:
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self._path)
+            except OSError as e:
+                print(f"Could not write metrics to {self._path}: {e}")
+
+    def _collect(self) -> Dict[str, dict]:
+        """Every process's metrics in the shared folder, summed per metric and label values."""
+        self.flush()
+        totals = {metric.name: {} for metric in self._metrics}
+        for filename in os.listdir(self._directory):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self._directory, filename)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue                      # Removed or half-written by its process just now
+            for metric in self._metrics:
+                series = {tuple(key): value for key, value in data.get(metric.name, [])}
+                metric.merge(totals[metric.name], series)
+        return totals
+
+    def render(self) -> str:
+        totals = self._collect() if self._directory is not None else {}
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(totals.get(metric.name)))
+        return "\n".join(lines) + "\n"
+
+
+# Shared registry exposed by the Flask app at /metrics
+registry = MetricsRegistry()
+
+REQUEST_SECONDS = registry.histogram(
+    "taxagent_http_request_duration_seconds", "Time spent handling a request, by endpoint",
+    ("method", "endpoint", "status"))
+STAGE_SECONDS = registry.histogram(
+    "taxagent_stage_duration_seconds", "Time spent in each processing stage",
+    ("stage",))
+DOCUMENTS = registry.counter(
+    "taxagent_documents_processed_total", "Uploaded documents processed, by detected type",
+    ("type",))
+PARSE_ERRORS = registry.counter(
+    "taxagent_parse_errors_total", "Documents whose values could not be parsed, by detected type",
+    ("type",))
+OCR_FALLBACKS = registry.counter(
+    "taxagent_ocr_fallbacks_total", "Documents or pages that had to be OCRed for lack of a text layer",
+    ("mode",))
+CACHE_LOOKUPS = registry.counter(
+    "taxagent_extraction_cache_lookups_total", "Extraction cache lookups, by result",
+    ("result",))
+PDF_CLASSIFICATIONS = registry.counter(
+    "taxagent_pdf_classifications_total",
+    "Scanned/digital classification of PDFs before extraction, and whether the chosen path needed an OCR fallback",
+    ("kind", "reason", "outcome"))
+DOCUMENT_PEAK_MEMORY = registry.histogram(
+    "taxagent_document_peak_memory_bytes",
+    "Peak memory growth while extracting one document (extracting process, or the OCR worker rendering a page)",
+    buckets=(1 << 20, 4 << 20, 16 << 20, 64 << 20, 128 << 20, 256 << 20, 512 << 20, 1 << 30, 2 << 30, 4 << 30))
+EXTRACTION_LIMITS_EXCEEDED = registry.counter(
+    "taxagent_extraction_limits_exceeded_total", "Documents rejected for exceeding a page, pixel or time limit",
+    ("limit",))
+FORM_RENDERS = registry.counter(
+    "taxagent_form_renders_total", "1040s requested by /calculate-tax, by whether the PDF was rendered or reused",
+    ("result",))
+
+if METRICS_DIR:
+    registry.share(METRICS_DIR)
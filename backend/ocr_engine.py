@@ -0,0 +1,324 @@
+import os
+import math
+import atexit
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from dataclasses import dataclass, replace
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from extraction_limits import DocumentBudget, ExtractionLimits
+
+# fitz, NumPy, Pillow and pytesseract are imported where they're used so that importing the
+# app stays fast; the startup prewarm thread loads them in the background
+
+# Number of OCR worker processes (pages of one document are spread across them)
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Rasterization resolution for pages whose resolution isn't chosen adaptively; 72 matches
+# PyMuPDF's get_pixmap() default
+OCR_DPI = int(os.environ.get("OCR_DPI", 72))
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    return os.environ.get(name, "1" if default else "0").lower() not in ("0", "false", "no", "")
+
+
+@dataclass(frozen=True)
+class OCRSettings:
+    dpi: int = OCR_DPI
+    # Render scanned pages at the resolution of their embedded scan, clamped to [min_dpi, max_dpi]
+    adaptive_dpi: bool = _env_flag("OCR_ADAPTIVE_DPI", False)
+    min_dpi: int = int(os.environ.get("OCR_MIN_DPI", 150))
+    max_dpi: int = int(os.environ.get("OCR_MAX_DPI", 300))
+    # Crop to the inked area of the page, found on a low-resolution thumbnail
+    crop: bool = _env_flag("OCR_CROP", False)
+    # Otsu-threshold the grayscale render before handing it to Tesseract
+    binarize: bool = _env_flag("OCR_BINARIZE", False)
+    # Largest single render; pages or boxes that would exceed it are rendered at a lower dpi
+    max_page_pixels: int = int(os.environ.get("OCR_MAX_PAGE_PIXELS", 25_000_000))
+    # Tesseract page segmentation mode and character whitelist for full pages (None: Tesseract default)
+    psm: Optional[int] = int(os.environ["OCR_PSM"]) if os.environ.get("OCR_PSM") else None
+    whitelist: Optional[str] = os.environ.get("OCR_CHAR_WHITELIST") or None
+    # Used when re-reading a single numeric box: one text line, amount characters only
+    numeric_psm: int = 7
+    numeric_whitelist: str = "0123456789.,$"
+
+    def tesseract_config(self, numeric: bool = False) -> str:
+        psm = self.numeric_psm if numeric else self.psm
+        whitelist = self.numeric_whitelist if numeric else self.whitelist
+        options = []
+        if psm is not None:
+            options.append(f"--psm {psm}")
+        if whitelist:
+            options.append(f"-c tessedit_char_whitelist={whitelist}")
+        return " ".join(options)
+
+
+# Settings of the shared engine; LEGACY_OCR_SETTINGS is the original full-page 72 dpi render. The
+# adaptive dpi, crop and binarize steps are opt-in until their accuracy has been checked against
+# real scans with Tesseract
+DEFAULT_OCR_SETTINGS = OCRSettings()
+LEGACY_OCR_SETTINGS = OCRSettings(dpi=72, adaptive_dpi=False, crop=False, binarize=False, psm=None, whitelist=None)
+
+# Resolution of the thumbnail used to find the inked area, and the margin kept around it (points)
+CROP_THUMBNAIL_DPI = 36
+CROP_MARGIN = 12
+# Gray levels at or below this count as ink on the thumbnail
+INK_THRESHOLD = 200
+
+
+def open_pdf(source):
+    """Open a PDF given either a file path or the raw bytes of the file."""
+    import fitz
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=bytes(source), filetype="pdf")
+    return fitz.open(source)
+
+
+def pixmap_to_image(pix) -> "Image.Image":
+    """Wrap the raw pixmap samples in a PIL image without a PNG encode/decode."""
+    from PIL import Image
+    mode = "L" if pix.n == 1 else "RGB"
+    return Image.frombuffer(mode, (pix.width, pix.height), pix.samples, "raw", mode, pix.stride, 1)
+
+
+def pixmap_to_array(pix) -> "np.ndarray":
+    """Grayscale pixmap samples as a (height, width) uint8 array, without copying."""
+    import numpy as np
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+
+
+def page_dpi(page, settings: OCRSettings) -> int:
+    """Resolution to render a page at: the native resolution of its scan, within the configured bounds."""
+    if not settings.adaptive_dpi:
+        return settings.dpi
+    native = 0.0
+    for image in page.get_image_info():
+        x0, _, x1, _ = image["bbox"]
+        if x1 > x0:
+            native = max(native, image["width"] / ((x1 - x0) / 72))
+    if not native:
+        return settings.min_dpi
+    return int(min(max(native, settings.min_dpi), settings.max_dpi))
+
+
+def content_rect(page) -> Optional["fitz.Rect"]:
+    """Bounding box of the inked area in page coordinates, or None for a blank page."""
+    import fitz
+    import numpy as np
+    pix = page.get_pixmap(dpi=CROP_THUMBNAIL_DPI, colorspace=fitz.csGRAY, alpha=False)
+    ink = pixmap_to_array(pix) <= INK_THRESHOLD
+    pix = None
+    rows = np.flatnonzero(ink.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(ink.any(axis=0))
+    scale = 72 / CROP_THUMBNAIL_DPI
+    rect = fitz.Rect(cols[0] * scale, rows[0] * scale, (cols[-1] + 1) * scale, (rows[-1] + 1) * scale)
+    rect = fitz.Rect(rect.x0 - CROP_MARGIN, rect.y0 - CROP_MARGIN, rect.x1 + CROP_MARGIN, rect.y1 + CROP_MARGIN)
+    return rect & page.rect
+
+
+def otsu_threshold(gray: "np.ndarray") -> int:
+    """Gray level that best separates ink from background (Otsu's method)."""
+    import numpy as np
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256, dtype=np.float64)
+    weight_background = np.cumsum(histogram)
+    weight_foreground = weight_background[-1] - weight_background
+    cumulative_mean = np.cumsum(histogram * levels)
+    mean_background = cumulative_mean / np.maximum(weight_background, 1)
+    mean_foreground = (cumulative_mean[-1] - cumulative_mean) / np.maximum(weight_foreground, 1)
+    between_variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+    return int(np.argmax(between_variance))
+
+
+def render_for_ocr(page, settings: OCRSettings, clip=None) -> Tuple[Optional["Image.Image"], Optional["fitz.Rect"], int]:
+    """Render (part of) a page for Tesseract; returns the image, the rendered area and the dpi used."""
+    import fitz
+    import numpy as np
+    from PIL import Image
+    dpi = page_dpi(page, settings)
+    # Clip rectangles are unrotated page coordinates, so rotated pages are rendered whole
+    if clip is None and settings.crop and not page.rotation:
+        clip = content_rect(page)
+        if clip is None:
+            return None, None, dpi
+    # Oversized pages (posters, malformed media boxes) are rendered at whatever dpi fits the pixel cap
+    area = clip or page.rect
+    if area.width * area.height * (dpi / 72) ** 2 > settings.max_page_pixels:
+        dpi = max(1, int(72 * math.sqrt(settings.max_page_pixels / max(area.width * area.height, 1))))
+    # Grayscale without alpha: a third of the bytes of RGB and what Tesseract binarizes anyway
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False, clip=clip)
+    if not settings.binarize:
+        image = pixmap_to_image(pix)
+    else:
+        gray = pixmap_to_array(pix)
+        image = Image.fromarray(np.where(gray > otsu_threshold(gray), 255, 0).astype(np.uint8), mode="L")
+        gray = None
+    # The image holds its own copy of the samples; release MuPDF's buffer now rather than at GC
+    pix = None
+    return image, area, dpi
+
+
+def _tesseract_timeout(budget: Optional[DocumentBudget]) -> float:
+    # pytesseract kills Tesseract after this many seconds (0: no limit)
+    if budget is None:
+        return 0
+    remaining = budget.remaining_seconds()
+    if remaining <= 0:
+        raise budget.limits.timeout_error()
+    return remaining
+
+
+def _run_tesseract(run, image, budget: Optional[DocumentBudget]):
+    # Charges the render to the budget while the image is alive, runs Tesseract, then frees the image
+    try:
+        if budget is not None:
+            budget.charge(pixels=image.width * image.height)
+        try:
+            return run(timeout=_tesseract_timeout(budget))
+        except RuntimeError as e:
+            if budget is not None and 'timeout' in str(e).lower():
+                raise budget.limits.timeout_error()
+            raise
+    finally:
+        image.close()
+
+
+def ocr_page(page, settings: OCRSettings = DEFAULT_OCR_SETTINGS, budget: Optional[DocumentBudget] = None) -> str:
+    """OCR a single PyMuPDF page."""
+    import pytesseract
+    image, _, _ = render_for_ocr(page, settings)
+    if image is None:
+        return ""
+    return _run_tesseract(lambda timeout: pytesseract.image_to_string(
+        image, config=settings.tesseract_config(), timeout=timeout), image, budget)
+
+
+def ocr_words(page, settings: OCRSettings = DEFAULT_OCR_SETTINGS, budget: Optional[DocumentBudget] = None) -> List[tuple]:
+    """OCR a page into word boxes shaped like PyMuPDF's get_text("words") output, in page coordinates."""
+    import pytesseract
+    image, area, dpi = render_for_ocr(page, settings)
+    if image is None:
+        return []
+    data = _run_tesseract(lambda timeout: pytesseract.image_to_data(
+        image, config=settings.tesseract_config(), output_type=pytesseract.Output.DICT, timeout=timeout), image, budget)
+    scale = 72 / dpi
+    words = []
+    for i, text in enumerate(data["text"]):
+        text = text.strip()
+        if not text:
+            continue
+        x0 = area.x0 + data["left"][i] * scale
+        y0 = area.y0 + data["top"][i] * scale
+        words.append((x0, y0, x0 + data["width"][i] * scale, y0 + data["height"][i] * scale, text,
+                      data["block_num"][i] * 1000 + data["par_num"][i], data["line_num"][i], data["word_num"][i]))
+    return words
+
+
+def ocr_number(page, rect, settings: OCRSettings = DEFAULT_OCR_SETTINGS, budget: Optional[DocumentBudget] = None) -> str:
+    """Re-read one numeric box at no less than the maximum resolution, amount characters only."""
+    import fitz
+    import pytesseract
+    clip = fitz.Rect(rect) & page.rect
+    if clip.is_empty:
+        return ""
+    numeric = replace(settings, adaptive_dpi=False, dpi=max(settings.max_dpi, settings.dpi))
+    image, _, _ = render_for_ocr(page, numeric, clip=clip)
+    return _run_tesseract(lambda timeout: pytesseract.image_to_string(
+        image, config=settings.tesseract_config(numeric=True), timeout=timeout), image, budget).strip()
+
+
+def spool_pdf(data) -> str:
+    """Write an in-memory PDF to a temporary file and return its path; the caller removes it."""
+    fd, path = tempfile.mkstemp(prefix="ocr-", suffix=".pdf")
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def _ocr_page_worker(path: str, page_number: int, settings: OCRSettings, limits: ExtractionLimits,
+                     deadline: float) -> Tuple[str, int, int]:
+    # Runs inside a pool process; fitz documents can't be pickled so each task reopens the file.
+    # Returns the text with the pixels rendered and the memory it took, for the parent's budget
+    budget = DocumentBudget(limits, deadline)
+    with open_pdf(path) as doc:
+        text = ocr_page(doc[page_number], settings, budget)
+    return text, budget.pixels, budget.peak_memory
+
+
+class OCREngine:
+    """Runs Tesseract over the pages of a PDF on a bounded process pool."""
+
+    def __init__(self, workers: int = OCR_WORKERS, settings: OCRSettings = DEFAULT_OCR_SETTINGS):
+        self.workers = max(1, workers)
+        self.settings = settings
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Pool is created on first use so importing the app doesn't fork workers
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def iter_pages(self, source, page_numbers: Optional[Sequence[int]] = None,
+                   budget: Optional[DocumentBudget] = None) -> Iterator[str]:
+        """Yield the OCR text of each requested page, in page order, within the document's budget."""
+        if page_numbers is None:
+            with open_pdf(source) as doc:
+                page_numbers = range(doc.page_count)
+        page_numbers = list(page_numbers)
+
+        # Not worth the IPC for a single page or a single worker
+        if self.workers == 1 or len(page_numbers) <= 1:
+            with open_pdf(source) as doc:
+                for n in page_numbers:
+                    yield ocr_page(doc[n], self.settings, budget)
+            return
+
+        # Workers open the PDF from a file, so a page task carries a path and a page number rather
+        # than a pickled copy of the whole document
+        spooled = spool_pdf(source) if isinstance(source, (bytes, bytearray, memoryview)) else None
+        path = spooled or os.fspath(source)
+
+        # Every page runs against the document's deadline, not a fresh time limit of its own. Results
+        # are taken in submission order, so page order is kept; once the budget runs out (or the
+        # caller stops reading) the pages not started yet are cancelled
+        executor = self._get_executor()
+        if budget is None:
+            budget = DocumentBudget()
+        futures = [executor.submit(_ocr_page_worker, path, n, self.settings, budget.limits, budget.deadline)
+                   for n in page_numbers]
+        try:
+            for future in futures:
+                text, pixels, memory = future.result(timeout=budget.remaining_seconds())
+                budget.charge(pixels, memory)
+                yield text
+        except FuturesTimeoutError:
+            raise budget.limits.timeout_error()
+        finally:
+            for future in futures:
+                future.cancel()
+            if spooled is not None:
+                # Workers still reading it keep their open handle
+                os.remove(spooled)
+
+    def ocr_pages(self, source, page_numbers: Optional[Sequence[int]] = None,
+                  budget: Optional[DocumentBudget] = None) -> List[str]:
+        """Return the OCR text of each requested page, in page order."""
+        return list(self.iter_pages(source, page_numbers, budget))
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+# Shared engine used by the Flask app
+ocr_engine = OCREngine()
+atexit.register(ocr_engine.shutdown)
@@ -0,0 +1,56 @@
+import os
+import re
+from dataclasses import dataclass
+
+from ocr_engine import open_pdf
+
+# Share of a page covered by images above which a page without fonts is taken to be a scan
+SCAN_IMAGE_COVERAGE = float(os.environ.get("SCAN_IMAGE_COVERAGE", 0.5))
+
+# Pages inspected; a tax form's first pages decide it and a long document shouldn't be walked twice
+CLASSIFY_MAX_PAGES = int(os.environ.get("CLASSIFY_MAX_PAGES", 10))
+
+# Producer strings of scanner and copier software, which write image-only PDFs
+SCANNER_PRODUCERS = re.compile(
+    r'scan|canon|xerox|ricoh|konica|kyocera|brother|epson|sharp|lexmark|hp digital sending|paperport|naps2',
+    re.IGNORECASE
+)
+
+
+@dataclass(frozen=True)
+class PDFClass:
+    """Which extraction path a PDF should take: 'digital' (text layer), 'scanned' (OCR) or 'unknown'."""
+    kind: str
+    reason: str
+
+
+def classify_pdf(source) -> PDFClass:
+    """Classify a PDF from its structure (font resources, image coverage, producer) without extracting text."""
+    try:
+        with open_pdf(source) as doc:
+            producer = (doc.metadata or {}).get('producer') or ''
+            pages = [doc[n] for n in range(min(doc.page_count, CLASSIFY_MAX_PAGES))]
+            with_fonts = 0
+            scanned = 0
+            for page in pages:
+                if page.get_fonts():
+                    with_fonts += 1
+                    continue
+                area = abs(page.rect) or 1.0
+                covered = sum(abs(page.rect & image['bbox']) for image in page.get_image_info())
+                if covered / area >= SCAN_IMAGE_COVERAGE:
+                    scanned += 1
+    except Exception:
+        # Left to the extraction path, which reports a damaged file the way it always has
+        return PDFClass('unknown', 'unreadable')
+
+    if not pages:
+        return PDFClass('unknown', 'no_pages')
+    if with_fonts == len(pages):
+        return PDFClass('digital', 'fonts')
+    if scanned == len(pages):
+        return PDFClass('scanned', 'image_pages')
+    if not with_fonts and SCANNER_PRODUCERS.search(producer):
+        return PDFClass('scanned', 'scanner_producer')
+    # Some pages scanned and some with text, or pages with neither (vector outlines, blank pages)
+    return PDFClass('unknown', 'mixed' if with_fonts else 'no_text_or_images')
@@ -0,0 +1,105 @@
+import io
+import os
+import csv
+import json
+import itertools
+from typing import Any, Dict, Iterator, List
+
+from tax_logic import FILING_STATUSES, calculate_total_tax_batch
+from tax_rules import DEFAULT_TAX_YEAR
+
+#Input columns of a batch record; only total_income and filing_status are required
+BATCH_INPUT_FIELDS = ['total_income', 'filing_status', 'dependent_children', 'other_dependents', 'federal_withheld']
+BATCH_OUTPUT_FIELDS = ['taxable_income', 'tax_before_credits', 'credits_applied', 'tax_owed', 'refund_or_due']
+
+#Records computed and serialized per streamed chunk
+BATCH_CHUNK_SIZE = 10000
+
+#Most returns one /calculate-tax/batch request may compute; larger requests get a 413
+TAX_BATCH_MAX_RECORDS = int(os.environ.get("TAX_BATCH_MAX_RECORDS", 100000))
+
+
+class BatchTooLarge(ValueError):
+    pass
+
+
+def read_batch_records(body: bytes, content_type: str, max_records: int = None) -> List[dict]:
+    """Parse a JSON array (or {"returns": [...]}) or a CSV with a header row into records.
+
+    With max_records, more records than that raise BatchTooLarge; a CSV is read no further.
+    """
+    if 'csv' in (content_type or ''):
+        reader = csv.DictReader(io.StringIO(body.decode('utf-8-sig')))
+        data = list(reader if max_records is None else itertools.islice(reader, max_records + 1))
+    else:
+        data = json.loads(body or b'null')
+        if isinstance(data, dict):
+            data = data.get('returns')
+        if not isinstance(data, list):
+            raise ValueError("Expected a JSON array of returns or an object with a 'returns' array")
+    if max_records is not None and len(data) > max_records:
+        raise BatchTooLarge(f"More than the limit of {max_records} returns per request")
+    return data
+
+
+def records_to_columns(records: List[dict]) -> Dict[str, Any]:
+    """Validate records and turn them into the column arrays calculate_total_tax_batch takes."""
+    columns = {field: [] for field in BATCH_INPUT_FIELDS}
+    columns['id'] = []
+    for i, record in enumerate(records):
+        if not isinstance(record, dict) or record.get('total_income') in (None, '') or not record.get('filing_status'):
+            raise ValueError(f"Record {i}: total_income and filing_status are required")
+        try:
+            columns['total_income'].append(float(record['total_income']))
+            columns['dependent_children'].append(int(record.get('dependent_children') or 0))
+            columns['other_dependents'].append(int(record.get('other_dependents') or 0))
+            columns['federal_withheld'].append(float(record.get('federal_withheld') or 0))
+        except (TypeError, ValueError):
+            raise ValueError(f"Record {i}: amounts and dependent counts must be numbers")
+        if record['filing_status'] not in FILING_STATUSES:
+            raise ValueError(f"Record {i}: unknown filing status {record['filing_status']!r}")
+        columns['filing_status'].append(record['filing_status'])
+        columns['id'].append(record.get('id', i))
+    import numpy as np
+    ids = columns.pop('id')
+    return {'id': ids, **{field: np.asarray(values) for field, values in columns.items()}}
+
+
+def compute_batch(columns: Dict[str, Any], tax_year: int = DEFAULT_TAX_YEAR,
+                  chunk_size: int = BATCH_CHUNK_SIZE) -> Iterator[List[dict]]:
+    """Yield lists of result records, computing chunk_size returns at a time."""
+    for start in range(0, len(columns['total_income']), chunk_size):
+        chunk = {field: values[start:start + chunk_size] for field, values in columns.items()}
+        results = calculate_total_tax_batch(
+            chunk['total_income'],
+            chunk['filing_status'],
+            chunk['dependent_children'],
+            chunk['other_dependents'],
+            chunk['federal_withheld'],
+            tax_year
+        )
+        output_columns = [chunk['id']]
+        output_columns += [chunk[field].tolist() for field in BATCH_INPUT_FIELDS]
+        output_columns += [results[field].tolist() for field in BATCH_OUTPUT_FIELDS]
+        keys = ['id'] + BATCH_INPUT_FIELDS + BATCH_OUTPUT_FIELDS
+        yield [dict(zip(keys, row)) for row in zip(*output_columns)]
+
+
+def stream_ndjson(columns: Dict[str, Any], tax_year: int = DEFAULT_TAX_YEAR) -> Iterator[str]:
+    for chunk in compute_batch(columns, tax_year):
+        yield "".join(json.dumps(record) + "\n" for record in chunk)
+
+
+def stream_csv(columns: Dict[str, Any], tax_year: int = DEFAULT_TAX_YEAR) -> Iterator[str]:
+    fieldnames = ['id'] + BATCH_INPUT_FIELDS + BATCH_OUTPUT_FIELDS
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for chunk in compute_batch(columns, tax_year):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
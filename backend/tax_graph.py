@@ -0,0 +1,111 @@
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from form_filler import build_1040_field_values
+
+# Values a return is computed from: the session's running totals and personal info, the tax year
+# and that year's rule set (a reloaded rule file is a changed input like any other)
+RETURN_INPUTS = ('wages', 'nec_income', 'interest_income', 'federal_withheld',
+                 'filing_status', 'dependent_children', 'other_dependents', 'tax_year', 'rules')
+
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class LineItem:
+    """One computed line of the return and the values (inputs or other lines) it is computed from."""
+    name: str
+    depends_on: Tuple[str, ...]
+    compute: Callable[..., Any]
+
+
+#Computed lines, each after every line it depends on; mirrors calculate_total_tax
+LINE_ITEMS = (
+    LineItem('total_income', ('wages', 'nec_income', 'interest_income'),
+             lambda wages, nec_income, interest_income: wages + nec_income + interest_income),
+    LineItem('standard_deduction', ('rules', 'filing_status'),
+             lambda rules, filing_status: rules.standard_deductions[filing_status]),
+    LineItem('taxable_income', ('total_income', 'standard_deduction'),
+             lambda total_income, standard_deduction: max(total_income - standard_deduction, 0)),
+    LineItem('tax_no_credits', ('rules', 'taxable_income', 'filing_status'),
+             lambda rules, taxable_income, filing_status: rules.tax(taxable_income, filing_status)),
+    LineItem('credits', ('rules', 'filing_status', 'dependent_children', 'other_dependents', 'total_income'),
+             lambda rules, *args: rules.dependent_credits(*args)),
+    LineItem('tax_owed', ('tax_no_credits', 'credits'),
+             lambda tax_no_credits, credits: max(tax_no_credits - credits, 0)),
+    LineItem('refund_or_due', ('federal_withheld', 'tax_owed'),
+             lambda federal_withheld, tax_owed: federal_withheld - tax_owed),
+)
+
+# Arguments of build_1040_field_values, all of them inputs or lines
+FORM_VALUES = ('wages', 'nec_income', 'interest_income', 'federal_withheld', 'total_income', 'tax_no_credits',
+               'tax_owed', 'refund_or_due', 'filing_status', 'dependent_children', 'other_dependents', 'tax_year')
+
+
+class TaxReturnGraph:
+    """A return's line items, recomputed only where an input they depend on has changed."""
+
+    def __init__(self, lines: Tuple[LineItem, ...] = LINE_ITEMS):
+        self.lines = lines
+        self.values: Dict[str, Any] = {}
+        self._readers: Dict[str, List[str]] = defaultdict(list)
+        for line in lines:
+            for name in line.depends_on:
+                self._readers[name].append(line.name)
+        # 1040 field values of the current values, built on first use
+        self._form_fields: Optional[Dict[str, str]] = None
+        self.lock = threading.Lock()
+
+    def update(self, **inputs) -> Set[str]:
+        """Set inputs and recompute the lines downstream of the changed ones; returns every changed name."""
+        changed = {name for name, value in inputs.items() if self.values.get(name, _MISSING) != value}
+        dirty = set()
+        for name in changed:
+            self.values[name] = inputs[name]
+            dirty.update(self._readers[name])
+
+        # Lines are in dependency order, so one pass sees every line after its inputs are final. A line
+        # whose value comes out the same doesn't dirty the lines that read it
+        for line in self.lines:
+            if line.name not in dirty:
+                continue
+            value = line.compute(*(self.values[name] for name in line.depends_on))
+            if self.values.get(line.name, _MISSING) != value:
+                self.values[line.name] = value
+                changed.add(line.name)
+                dirty.update(self._readers[line.name])
+
+        if 'rules' in changed or not changed.isdisjoint(FORM_VALUES):
+            self._form_fields = None
+        return changed
+
+    def form_fields(self) -> Dict[str, str]:
+        """1040 field values of the current lines."""
+        if self._form_fields is None:
+            self._form_fields = build_1040_field_values(**{name: self.values[name] for name in FORM_VALUES})
+        return self._form_fields
+
+
+class TaxReturnGraphStore:
+    """Each session's return graph, kept in this process; the tax data store stays the source of truth."""
+
+    def __init__(self):
+        self._graphs: Dict[str, TaxReturnGraph] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> TaxReturnGraph:
+        with self._lock:
+            graph = self._graphs.get(session_id)
+            if graph is None:
+                graph = self._graphs[session_id] = TaxReturnGraph()
+            return graph
+
+    def discard_session(self, session_id: str):
+        with self._lock:
+            self._graphs.pop(session_id, None)
+
+
+# Shared store used by the Flask app
+return_graphs = TaxReturnGraphStore()
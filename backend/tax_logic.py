@@ -0,0 +1,104 @@
+from typing import Dict, Tuple
+
+from tax_rules import CompiledBrackets, FILING_STATUSES, DEFAULT_TAX_YEAR, tax_rules
+
+#Brackets, deductions and credits live in tax_rules/<jurisdiction>/<year>.json; every function
+#takes the tax year whose rules it should apply
+
+def get_compiled_brackets(filing_status: str, tax_year: int = DEFAULT_TAX_YEAR) -> CompiledBrackets:
+    return tax_rules.get(tax_year).compiled[filing_status]
+
+def calculate_dependent_credits(filing_status: str, dependent_children: int, other_dependents: int, adjusted_gross_income: float,
+                                tax_year: int = DEFAULT_TAX_YEAR):
+    return tax_rules.get(tax_year).dependent_credits(filing_status, dependent_children, other_dependents, adjusted_gross_income)
+
+def calculate_tax(taxable_income: float, filing_status: str, tax_year: int = DEFAULT_TAX_YEAR) -> float:
+    """Calculate tax based on taxable income and filing status."""
+    # One bisection plus one multiply on the precompiled table
+    return get_compiled_brackets(filing_status, tax_year).tax(taxable_income)
+
+def calculate_total_tax(total_income: float, filing_status: str, dependent_children: int = 0, other_dependents: int = 0,
+                        tax_year: int = DEFAULT_TAX_YEAR) -> Tuple[float, float]:
+    """Calculate total tax including credits."""
+    rules = tax_rules.get(tax_year)
+
+    # Calculate taxable income after standard deduction
+    standard_deduction = rules.standard_deductions[filing_status]
+    taxable_income = max(total_income - standard_deduction, 0)
+    
+    # Calculate tax before credits
+    tax_before_credits = rules.tax(taxable_income, filing_status)
+    
+    # Calculate dependent credits with phase-out
+    dependent_credits = calculate_dependent_credits(
+        filing_status, 
+        dependent_children, 
+        other_dependents, 
+        total_income,
+        tax_year
+    )
+    
+    # Apply credits (can't reduce tax below zero)
+    final_tax = max(tax_before_credits - dependent_credits, 0)
+    
+    return tax_before_credits, final_tax, dependent_credits
+
+
+def filing_status_codes(filing_statuses) -> "np.ndarray":
+    """Map filing status strings to row indices of the vectorized tables."""
+    import numpy as np
+    index = {status: i for i, status in enumerate(FILING_STATUSES)}
+    try:
+        return np.array([index[status] for status in filing_statuses], dtype=np.intp)
+    except KeyError as e:
+        raise ValueError(f"Unknown filing status: {e.args[0]}")
+
+def calculate_total_tax_batch(total_income, filing_status, dependent_children=0, other_dependents=0,
+                              federal_withheld=0, tax_year: int = DEFAULT_TAX_YEAR) -> Dict[str, "np.ndarray"]:
+    """Vectorized calculate_total_tax over many returns, plus refund (positive) or amount due (negative)."""
+    # NumPy is only loaded once a batch is actually computed, keeping it off the startup path
+    import numpy as np
+    total_income = np.asarray(total_income, dtype=float)
+    status = filing_status_codes(np.atleast_1d(filing_status))
+    status = np.broadcast_to(status, total_income.shape)
+    dependent_children = np.broadcast_to(np.asarray(dependent_children, dtype=float), total_income.shape)
+    other_dependents = np.broadcast_to(np.asarray(other_dependents, dtype=float), total_income.shape)
+    federal_withheld = np.broadcast_to(np.asarray(federal_withheld, dtype=float), total_income.shape)
+
+    rules = tax_rules.get(tax_year)
+    lowers, uppers, rates, base_tax, deductions, thresholds = rules.vector_tables()
+
+    # Taxable income after standard deduction
+    taxable_income = np.maximum(total_income - deductions[status], 0)
+
+    # Highest bracket each income exceeds, searched per filing status like CompiledBrackets.tax
+    bracket = np.empty(taxable_income.shape, dtype=np.intp)
+    for code in range(len(FILING_STATUSES)):
+        rows = status == code
+        bracket[rows] = np.searchsorted(lowers[code], taxable_income[rows], side='left') - 1
+    reached = bracket >= 0
+    bracket = np.maximum(bracket, 0)
+    tax_before_credits = np.where(
+        reached,
+        base_tax[status, bracket]
+        + (np.minimum(taxable_income, uppers[status, bracket]) - lowers[status, bracket]) * rates[status, bracket],
+        0.0
+    )
+
+    # Dependent credits, reduced for every full phase-out step of income over the threshold
+    raw_credit = dependent_children * rules.child_tax_credit + other_dependents * rules.other_dependent_credit
+    threshold = thresholds[status]
+    phase_out_amount = np.floor_divide(total_income - threshold, rules.phase_out_step) * rules.phase_out_reduction
+    dependent_credits = np.where(total_income <= threshold, raw_credit,
+                                 np.maximum(raw_credit - phase_out_amount, 0))
+
+    # Apply credits (can't reduce tax below zero)
+    final_tax = np.maximum(tax_before_credits - dependent_credits, 0)
+
+    return {
+        'taxable_income': taxable_income,
+        'tax_before_credits': tax_before_credits,
+        'credits_applied': dependent_credits,
+        'tax_owed': final_tax,
+        'refund_or_due': federal_withheld - final_tax
+    }
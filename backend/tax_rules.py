@@ -0,0 +1,226 @@
+import os
+import re
+import json
+import time
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# Rule files, one per jurisdiction and tax year: <TAX_RULES_DIR>/<jurisdiction>/<year>.json
+TAX_RULES_DIR = os.environ.get(
+    "TAX_RULES_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tax_rules')
+)
+
+# A loaded rule file is checked for changes at most this often; a changed file is recompiled
+# on its next use, so new or corrected tables go live without restarting workers
+TAX_RULES_RELOAD_INTERVAL = float(os.environ.get("TAX_RULES_RELOAD_INTERVAL", 5))
+
+# Tax year used when a request doesn't name one
+DEFAULT_TAX_YEAR = int(os.environ.get("DEFAULT_TAX_YEAR", 2024))
+DEFAULT_JURISDICTION = "federal"
+
+#Filing statuses in the row order used by the vectorized tables
+FILING_STATUSES = ['single', 'married_joint', 'married_separate', 'head_of_household', 'widow']
+
+JURISDICTION_PATTERN = re.compile(r'^[a-z0-9_-]{1,32}$')
+
+
+class TaxRulesError(ValueError):
+    pass
+
+
+#Tax Logic
+@dataclass
+class TaxBracket:
+    lower: float
+    upper: float
+    rate: float
+
+
+@dataclass(frozen=True)
+class CompiledBrackets:
+    """Bracket bounds and rates as sorted tuples, with the tax owed on all brackets below each one."""
+    lowers: Tuple[float, ...]
+    uppers: Tuple[float, ...]
+    rates: Tuple[float, ...]
+    base_tax: Tuple[float, ...]
+
+    def tax(self, taxable_income: float) -> float:
+        # Highest bracket whose lower bound the income exceeds
+        i = bisect_left(self.lowers, taxable_income) - 1
+        if i < 0:
+            return 0.0
+        return self.base_tax[i] + (min(taxable_income, self.uppers[i]) - self.lowers[i]) * self.rates[i]
+
+
+def compile_brackets(brackets: List[TaxBracket]) -> CompiledBrackets:
+    base_tax = []
+    tax = 0.0
+    for bracket in brackets:
+        base_tax.append(tax)
+        tax += (bracket.upper - bracket.lower) * bracket.rate
+    return CompiledBrackets(
+        lowers=tuple(float(b.lower) for b in brackets),
+        uppers=tuple(float(b.upper) for b in brackets),
+        rates=tuple(b.rate for b in brackets),
+        base_tax=tuple(base_tax)
+    )
+
+
+@dataclass(frozen=True)
+class TaxRules:
+    """One jurisdiction's rules for one tax year, compiled for lookups."""
+    jurisdiction: str
+    tax_year: int
+    version: str
+    brackets: Dict[str, List[TaxBracket]]
+    compiled: Dict[str, CompiledBrackets]
+    standard_deductions: Dict[str, float]
+    child_tax_credit: float
+    other_dependent_credit: float
+    phase_out_thresholds: Dict[str, float]
+    phase_out_step: float                     # Credits shrink by phase_out_reduction for every full
+    phase_out_reduction: float                # phase_out_step of income over the threshold
+    _vector_tables: dict = field(default_factory=dict, compare=False, repr=False)
+
+    def tax(self, taxable_income: float, filing_status: str) -> float:
+        return self.compiled[filing_status].tax(taxable_income)
+
+    def dependent_credits(self, filing_status: str, dependent_children: int, other_dependents: int,
+                          adjusted_gross_income: float) -> float:
+        total_raw_credit = dependent_children * self.child_tax_credit + other_dependents * self.other_dependent_credit
+        threshold = self.phase_out_thresholds[filing_status]
+        if adjusted_gross_income <= threshold:
+            return total_raw_credit
+        phase_out_amount = ((adjusted_gross_income - threshold) // self.phase_out_step) * self.phase_out_reduction
+        return max(total_raw_credit - phase_out_amount, 0)
+
+    def vector_tables(self):
+        """Compiled tables stacked into one row per filing status, plus deduction and phase-out threshold."""
+        if not self._vector_tables:
+            import numpy as np
+            tables = [self.compiled[status] for status in FILING_STATUSES]
+            self._vector_tables['tables'] = (
+                np.array([t.lowers for t in tables]),
+                np.array([t.uppers for t in tables]),
+                np.array([t.rates for t in tables]),
+                np.array([t.base_tax for t in tables]),
+                np.array([self.standard_deductions[status] for status in FILING_STATUSES], dtype=float),
+                np.array([self.phase_out_thresholds[status] for status in FILING_STATUSES], dtype=float)
+            )
+        return self._vector_tables['tables']
+
+
+def _amount(value) -> float:
+    # Whole-dollar amounts stay ints, as they were when the tables were Python constants
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TaxRulesError(f"Expected a number, got {value!r}")
+    return value
+
+
+def parse_rules(data: dict, jurisdiction: str, tax_year: int) -> TaxRules:
+    """Validate a rule file's contents and compile its bracket tables."""
+    try:
+        if data.get('jurisdiction', jurisdiction) != jurisdiction or int(data.get('tax_year', tax_year)) != tax_year:
+            raise TaxRulesError(f"Rule file for {jurisdiction} {tax_year} describes another jurisdiction or year")
+
+        # A filing status may name another status whose brackets it shares
+        brackets = {}
+        for status in FILING_STATUSES:
+            rows = data['brackets'][status]
+            if isinstance(rows, str):
+                rows = data['brackets'][rows]
+            brackets[status] = [
+                TaxBracket(float(lower), float('inf') if upper is None else float(upper), float(rate))
+                for lower, upper, rate in rows
+            ]
+            if any(b.lower > next_b.lower for b, next_b in zip(brackets[status], brackets[status][1:])):
+                raise TaxRulesError(f"{jurisdiction} {tax_year}: {status} brackets are not in ascending order")
+
+        credits = data['dependent_credits']
+        return TaxRules(
+            jurisdiction=jurisdiction,
+            tax_year=tax_year,
+            version=str(data.get('version', tax_year)),
+            brackets=brackets,
+            compiled={status: compile_brackets(rows) for status, rows in brackets.items()},
+            standard_deductions={status: _amount(data['standard_deduction'][status]) for status in FILING_STATUSES},
+            child_tax_credit=_amount(credits['child']),
+            other_dependent_credit=_amount(credits['other_dependent']),
+            phase_out_thresholds={status: _amount(credits['phase_out_threshold'][status]) for status in FILING_STATUSES},
+            phase_out_step=_amount(credits['phase_out_step']),
+            phase_out_reduction=_amount(credits['phase_out_reduction'])
+        )
+    except TaxRulesError:
+        raise
+    except (KeyError, TypeError, ValueError) as e:
+        raise TaxRulesError(f"Invalid {jurisdiction} tax rules for {tax_year}: {e!r}")
+
+
+class TaxRuleEngine:
+    """Rule sets by (jurisdiction, tax year), compiled once on first use and recompiled when their file changes."""
+
+    def __init__(self, directory: str = TAX_RULES_DIR, reload_interval: float = TAX_RULES_RELOAD_INTERVAL):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        # (jurisdiction, year) -> (rules, file mtime, monotonic time of the last mtime check)
+        self._loaded: Dict[Tuple[str, int], Tuple[TaxRules, int, float]] = {}
+        self._lock = threading.Lock()
+
+    def path(self, tax_year: int, jurisdiction: str = DEFAULT_JURISDICTION) -> str:
+        return os.path.join(self.directory, jurisdiction, f"{tax_year}.json")
+
+    def get(self, tax_year: Optional[int] = None, jurisdiction: str = DEFAULT_JURISDICTION) -> TaxRules:
+        """Rules for the tax year (default DEFAULT_TAX_YEAR); raises TaxRulesError if there are none."""
+        try:
+            key = (jurisdiction, DEFAULT_TAX_YEAR if tax_year is None else int(tax_year))
+        except (TypeError, ValueError):
+            raise TaxRulesError(f"Invalid tax year: {tax_year!r}")
+        now = time.monotonic()
+
+        # Served without touching the file system until the reload interval has passed
+        entry = self._loaded.get(key)
+        if entry is not None and now - entry[2] < self.reload_interval:
+            return entry[0]
+
+        with self._lock:
+            entry = self._loaded.get(key)
+            if entry is not None and now - entry[2] < self.reload_interval:
+                return entry[0]
+            if not JURISDICTION_PATTERN.match(jurisdiction):
+                raise TaxRulesError(f"Invalid jurisdiction: {jurisdiction!r}")
+            path = self.path(key[1], jurisdiction)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                raise TaxRulesError(f"No {jurisdiction} tax rules for {key[1]}")
+
+            rules = entry[0] if entry is not None and entry[1] == mtime else None
+            if rules is None:
+                try:
+                    with open(path) as f:
+                        rules = parse_rules(json.load(f), jurisdiction, key[1])
+                except (OSError, json.JSONDecodeError, TaxRulesError) as e:
+                    # A file caught mid-write or with a mistake: keep serving the rules loaded before it
+                    if entry is None:
+                        raise TaxRulesError(f"Could not load {path}: {e}")
+                    print(f"Keeping previous {jurisdiction} {key[1]} tax rules: {e}")
+                    rules, mtime = entry[0], entry[1]
+            self._loaded[key] = (rules, mtime, now)
+            return rules
+
+    def years(self, jurisdiction: str = DEFAULT_JURISDICTION) -> List[int]:
+        """Tax years with a rule file on disk."""
+        if not JURISDICTION_PATTERN.match(jurisdiction):
+            return []
+        try:
+            names = os.listdir(os.path.join(self.directory, jurisdiction))
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[:-5]) for name in names if name.endswith('.json') and name[:-5].isdigit())
+
+
+# Shared engine; rule sets are loaded lazily, once per process
+tax_rules = TaxRuleEngine()
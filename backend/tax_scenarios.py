@@ -0,0 +1,116 @@
+import os
+from typing import Any, Dict, List
+
+from tax_logic import FILING_STATUSES, calculate_total_tax_batch
+from tax_batch import BATCH_OUTPUT_FIELDS
+from tax_rules import DEFAULT_TAX_YEAR
+
+#Amounts a scenario adjusts: swept values are added to the return's current amount
+SCENARIO_AMOUNT_FIELDS = ('wages', 'nec_income', 'interest_income', 'federal_withheld')
+#Swept as absolute values replacing the return's own
+SCENARIO_COUNT_FIELDS = ('dependent_children', 'other_dependents')
+
+# Largest grid evaluated in one request (product of all axis lengths)
+SCENARIO_MAX_POINTS = int(os.environ.get("SCENARIO_MAX_POINTS", 100000))
+
+
+def read_axis(name: str, spec: Any, integer: bool = False) -> List[float]:
+    """An axis given as a list of values or as {"start", "stop", "step"} (stop included)."""
+    cast = int if integer else float
+    try:
+        if isinstance(spec, dict):
+            start, stop, step = cast(spec.get('start', 0)), cast(spec['stop']), cast(spec['step'])
+            if step <= 0:
+                raise ValueError(f"{name}: step must be positive")
+            if (stop - start) / step >= SCENARIO_MAX_POINTS:
+                raise ValueError(f"{name}: more than {SCENARIO_MAX_POINTS} values")
+            values = []
+            i = 0
+            # Built by multiplication so float steps don't drift past stop
+            while start + i * step <= stop + (0 if integer else step * 1e-9):
+                values.append(start + i * step)
+                i += 1
+        elif isinstance(spec, list):
+            values = [cast(value) for value in spec]
+        else:
+            raise ValueError(f"{name}: expected a list of values or a start/stop/step range")
+    except (KeyError, TypeError):
+        raise ValueError(f"{name}: a range needs numeric start, stop and step")
+    if not values:
+        raise ValueError(f"{name}: no values")
+    if integer and min(values) < 0:
+        raise ValueError(f"{name}: counts can't be negative")
+    return values
+
+
+def read_sweep(sweep: Dict[str, Any]) -> List[tuple]:
+    """Validate a sweep request into (field, values) axes, in the order they vary in the results."""
+    if not isinstance(sweep, dict):
+        raise ValueError("Expected a JSON object of axes to sweep")
+    unknown = set(sweep) - set(SCENARIO_AMOUNT_FIELDS) - set(SCENARIO_COUNT_FIELDS) - {'filing_status', 'base'}
+    if unknown:
+        raise ValueError(f"Unknown sweep axes: {', '.join(sorted(unknown))}")
+
+    axes = []
+    for field in SCENARIO_AMOUNT_FIELDS:
+        if field in sweep:
+            axes.append((field, read_axis(field, sweep[field])))
+    if 'filing_status' in sweep:
+        statuses = sweep['filing_status']
+        if not isinstance(statuses, list) or not statuses or any(s not in FILING_STATUSES for s in statuses):
+            raise ValueError(f"filing_status: expected a list of {', '.join(FILING_STATUSES)}")
+        axes.append(('filing_status', statuses))
+    for field in SCENARIO_COUNT_FIELDS:
+        if field in sweep:
+            axes.append((field, read_axis(field, sweep[field], integer=True)))
+
+    points = 1
+    for _, values in axes:
+        points *= len(values)
+    if points > SCENARIO_MAX_POINTS:
+        raise ValueError(f"Sweep has {points} scenarios, more than the limit of {SCENARIO_MAX_POINTS}")
+    return axes
+
+
+def sweep_scenarios(base: Dict[str, Any], axes: List[tuple], tax_year: int = DEFAULT_TAX_YEAR) -> Dict[str, Any]:
+    """Tax and refund of the base return and of every combination of the axes, in one vectorized pass.
+
+    Row 0 of the batch is the base return itself; the grid follows with the last axis varying fastest.
+    """
+    import numpy as np
+    grids = dict(zip([field for field, _ in axes],
+                     np.meshgrid(*[np.asarray(values) for _, values in axes], indexing='ij'))) if axes else {}
+    size = 1 + (next(iter(grids.values())).size if grids else 0)
+
+    inputs = {}
+    for field, dtype in [(f, float) for f in SCENARIO_AMOUNT_FIELDS] + [(f, int) for f in SCENARIO_COUNT_FIELDS]:
+        inputs[field] = np.full(size, dtype(base[field]), dtype=dtype)
+    inputs['filing_status'] = np.full(size, base['filing_status'], dtype=object)
+    for field, grid in grids.items():
+        if field in SCENARIO_AMOUNT_FIELDS:
+            inputs[field][1:] = np.maximum(inputs[field][1:] + grid.ravel(), 0)
+        else:
+            inputs[field][1:] = grid.ravel()
+
+    total_income = inputs['wages'] + inputs['nec_income'] + inputs['interest_income']
+    results = calculate_total_tax_batch(
+        total_income,
+        inputs['filing_status'],
+        inputs['dependent_children'],
+        inputs['other_dependents'],
+        inputs['federal_withheld'],
+        tax_year
+    )
+
+    columns = {field: inputs[field][1:].tolist() for field, _ in axes}
+    columns['total_income'] = total_income[1:].tolist()
+    columns.update({field: results[field][1:].tolist() for field in BATCH_OUTPUT_FIELDS})
+    return {
+        'tax_year': tax_year,
+        'current': {**{field: inputs[field][0].item() for field in SCENARIO_AMOUNT_FIELDS + SCENARIO_COUNT_FIELDS},
+                    'filing_status': base['filing_status'], 'total_income': total_income[0].item(),
+                    **{field: results[field][0].item() for field in BATCH_OUTPUT_FIELDS}},
+        'axes': [{'name': field, 'values': values} for field, values in axes],
+        'scenarios': size - 1,
+        'results': columns
+    }
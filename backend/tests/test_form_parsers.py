@@ -0,0 +1,65 @@
+"""The spec-driven W-2/1099 parsers return what the original line-scan parsers in main.py returned."""
+import pytest
+
+from main import extract_INT, extract_NEC, extract_w2_values
+
+W2_LABELS = "b Employer identification number 1 Wages, tips, other comp 2 Federal income tax withheld"
+
+# (text, expected) pairs; expected values were recorded from the line-scan parsers before the form spec rewrite
+W2_CASES = [
+    (f"Form W-2 Wage and Tax Statement 2024\n{W2_LABELS}\n12-3456789 52000.00 6200.50\nc Employer's name",
+     (52000.0, 6200.5, None)),
+    ("W-2\n\n\nWages, tips\n\n   \n12-3456789   52000   6200\n", (52000.0, 6200.0, None)),
+    (f"Form W-2 Wage and Tax Statement 2024\n{W2_LABELS}\n12-3456789 52000.00\nc Employer's name",
+     (None, None, "Missing values in W-2 form (expected 2 numbers, found 1)")),
+    ("Form W-2 Wage and Tax Statement 2024\nb Employer identification number\n12-3456789\n",
+     (None, None, "Missing values in W-2 form (expected 2 numbers, found 0)")),
+    ("W-2\nWages, tips\n12-3456789 1 2 3\n", (None, None, "Missing values in W-2 form (expected 2 numbers, found 3)")),
+    ("Form W-2 Wage and Tax Statement 2024\n12-3456789 52000.00 6200.50", (None, None, "Could not find W-2 data labels")),
+    ("W-2\n\n  Federal income tax withheld  \n", (None, None, "Could not find W-2 data labels")),
+    ("W-2\nWages, tips\n12-3456789 52,000.00 6200.50", (None, None, "Invalid number format in W-2 values")),
+    ("", (None, None, "Empty document")),
+]
+
+NEC_CASES = [
+    ("Form 1099-NEC Nonemployee Compensation 2024\nPAYER'S TIN RECIPIENT'S TIN Copy B For Recipient\n"
+     "12-3456789 123-45-6789 $ 18000.00", (18000.0, None)),
+    ("Form 1099-NEC\nCopy B\n12-3456789 123-45-6789 $18000.00 750.00", (750.0, None)),
+    ("Form 1099-NEC Nonemployee Compensation 2024\nCopy B For Recipient\n12-3456789 123-45-6789 $",
+     (None, "Missing values in 1099-NEC form (expected 1 number, found 0)")),
+    ("1099-NEC\nCopy B\n12-3456789 100.00 200.00", (None, "Missing values in 1099-NEC form (expected 1 number, found 2)")),
+    ("Form 1099-NEC Nonemployee Compensation 2024\n12-3456789 $ 18000.00", (None, "Could not find 1099-NEC data labels")),
+    ("1099-NEC\nCopy B", (None, "Could not find 1099-NEC data labels")),
+    ("1099-NEC\nCopy B\n12-3456789 $ 18,000.00", (None, "Invalid number format in 1099-NEC values")),
+    ("", (None, "Empty document")),
+]
+
+INT_CASES = [
+    ("Form 1099-INT Interest Income 2024\nPAYER'S TIN RECIPIENT'S TIN 1 Interest income\n"
+     "12-3456789 123-45-6789 $ 750.25 2024\n2 Early withdrawal penalty", (750.25, None)),
+    ("1099-INT\n12-3456789 123-45-6789 $ 750.25\n2 Early withdrawal penalty", (750.25, None)),
+    ("1099-INT\n$ 20 2025 20\nend", (None, "Missing values in 1099-INT form (expected 1 number, found 2)")),
+    ("Form 1099-INT Interest Income 2024\n12-3456789 123-45-6789 $ 2024\n2 Early withdrawal penalty",
+     (None, "Missing values in 1099-INT form (expected 1 number, found 0)")),
+    ("1099-INT\nTIN $750.25 2024\nend", (None, "Missing values in 1099-INT form (expected 1 number, found 0)")),
+    ("1099-INT\n$ 100.00 200.00 2024\nend", (None, "Missing values in 1099-INT form (expected 1 number, found 2)")),
+    ("Form 1099-INT Interest Income 2024\n12-3456789 123-45-6789 750.25\nend", (None, "Could not find 1099-INT data labels")),
+    ("Form 1099-INT Interest Income 2024\n12-3456789 123-45-6789 $ 750.25 2024", (None, "Could not find 1099-INT data labels")),
+    ("1099-INT\n$ 1.2.3 7.5.0.1 2024\nend", (None, "Invalid number format in 1099-INT values")),
+    ("", (None, "Empty document")),
+]
+
+
+@pytest.mark.parametrize('text, expected', W2_CASES)
+def test_w2_matches_line_scan(text, expected):
+    assert extract_w2_values(text) == expected
+
+
+@pytest.mark.parametrize('text, expected', NEC_CASES)
+def test_nec_matches_line_scan(text, expected):
+    assert extract_NEC(text) == expected
+
+
+@pytest.mark.parametrize('text, expected', INT_CASES)
+def test_int_matches_line_scan(text, expected):
+    assert extract_INT(text) == expected
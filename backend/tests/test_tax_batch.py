@@ -0,0 +1,59 @@
+"""The vectorized batch and scenario calculations agree with calculate_total_tax, return by return."""
+import itertools
+
+import numpy as np
+import pytest
+
+from tax_logic import FILING_STATUSES, calculate_total_tax, calculate_total_tax_batch
+from tax_rules import tax_rules
+from tax_scenarios import sweep_scenarios
+
+# Around the standard deductions, bracket edges and credit phase-out thresholds, and well past them
+INCOMES = [0.0, 1.0, 14599.99, 14600.0, 29200.0, 47150.0, 100525.0, 199999.99, 200000.0, 200999.99,
+           201000.0, 243725.0, 400000.0, 400001.0, 425000.0, 609350.0, 1000000.0, 73750.25]
+CHILDREN = [0, 1, 3]
+OTHER_DEPENDENTS = [0, 2]
+WITHHELD = 6200.0
+
+
+def grid():
+    return list(itertools.product(INCOMES, FILING_STATUSES, CHILDREN, OTHER_DEPENDENTS))
+
+
+@pytest.mark.parametrize('tax_year', tax_rules.years())
+def test_batch_matches_scalar(tax_year):
+    returns = grid()
+    income, status, children, others = (list(column) for column in zip(*returns))
+    results = calculate_total_tax_batch(np.array(income), np.array(status, dtype=object),
+                                        np.array(children), np.array(others), WITHHELD, tax_year)
+
+    for i, (total_income, filing_status, dependent_children, other_dependents) in enumerate(returns):
+        tax_before_credits, tax_owed, credits = calculate_total_tax(
+            total_income, filing_status, dependent_children, other_dependents, tax_year)
+        assert results['tax_before_credits'][i] == pytest.approx(tax_before_credits, abs=1e-6)
+        assert results['credits_applied'][i] == pytest.approx(credits, abs=1e-6)
+        assert results['tax_owed'][i] == pytest.approx(tax_owed, abs=1e-6)
+        assert results['refund_or_due'][i] == pytest.approx(WITHHELD - tax_owed, abs=1e-6)
+
+
+@pytest.mark.parametrize('tax_year', tax_rules.years())
+def test_scenarios_match_scalar(tax_year):
+    base = {'wages': 55000.0, 'nec_income': 18000.0, 'interest_income': 750.25, 'federal_withheld': WITHHELD,
+            'filing_status': 'single', 'dependent_children': 1, 'other_dependents': 0}
+    axes = [('wages', [-55000.0, 0.0, 150000.0, 400000.0]), ('filing_status', list(FILING_STATUSES)),
+            ('dependent_children', CHILDREN), ('other_dependents', OTHER_DEPENDENTS)]
+    result = sweep_scenarios(base, axes, tax_year)
+    columns = result['results']
+    assert result['scenarios'] == len(columns['tax_owed']) == 4 * len(FILING_STATUSES) * 3 * 2
+
+    current = result['current']
+    _, tax_owed, _ = calculate_total_tax(73750.25, 'single', 1, 0, tax_year)
+    assert current['tax_owed'] == pytest.approx(tax_owed, abs=1e-6)
+
+    for i in range(result['scenarios']):
+        _, tax_owed, credits = calculate_total_tax(
+            columns['total_income'][i], columns['filing_status'][i],
+            columns['dependent_children'][i], columns['other_dependents'][i], tax_year)
+        assert columns['credits_applied'][i] == pytest.approx(credits, abs=1e-6)
+        assert columns['tax_owed'][i] == pytest.approx(tax_owed, abs=1e-6)
+        assert columns['refund_or_due'][i] == pytest.approx(WITHHELD - tax_owed, abs=1e-6)
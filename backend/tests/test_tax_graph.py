@@ -0,0 +1,43 @@
+"""TaxReturnGraph gives the same lines as calculate_total_tax, whether computed fresh or updated in place."""
+import itertools
+
+import pytest
+
+from tax_graph import TaxReturnGraph
+from tax_logic import FILING_STATUSES, calculate_total_tax
+from tax_rules import tax_rules
+
+# (wages, nec_income, interest_income): around the deductions, bracket edges and phase-out thresholds
+INCOMES = [(0.0, 0.0, 0.0), (14600.0, 0.0, 0.0), (29000.0, 200.0, 0.0), (55000.0, 18000.0, 750.25),
+           (150000.0, 49999.99, 0.01), (200000.0, 999.99, 0.0), (380000.0, 20000.0, 1.0), (900000.0, 0.0, 0.0)]
+CHILDREN = [0, 1, 3]
+OTHER_DEPENDENTS = [0, 2]
+WITHHELD = 6200.0
+
+
+def expected_lines(wages, nec_income, interest_income, filing_status, dependent_children, other_dependents, tax_year):
+    total_income = wages + nec_income + interest_income
+    tax_no_credits, tax_owed, credits = calculate_total_tax(
+        total_income, filing_status, dependent_children, other_dependents, tax_year)
+    return {'total_income': total_income, 'tax_no_credits': tax_no_credits, 'credits': credits,
+            'tax_owed': tax_owed, 'refund_or_due': WITHHELD - tax_owed}
+
+
+@pytest.mark.parametrize('tax_year', tax_rules.years())
+def test_graph_matches_scalar(tax_year):
+    rules = tax_rules.get(tax_year)
+    # One graph updated through the whole grid, so most updates recompute only part of the return
+    updated = TaxReturnGraph()
+    for (wages, nec_income, interest_income), filing_status, children, others in itertools.product(
+            INCOMES, FILING_STATUSES, CHILDREN, OTHER_DEPENDENTS):
+        inputs = dict(wages=wages, nec_income=nec_income, interest_income=interest_income, federal_withheld=WITHHELD,
+                      filing_status=filing_status, dependent_children=children, other_dependents=others,
+                      tax_year=tax_year, rules=rules)
+        expected = expected_lines(wages, nec_income, interest_income, filing_status, children, others, tax_year)
+
+        fresh = TaxReturnGraph()
+        fresh.update(**inputs)
+        updated.update(**inputs)
+        for graph in (fresh, updated):
+            for line, value in expected.items():
+                assert graph.values[line] == pytest.approx(value, abs=1e-6), (line, inputs)
@@ -0,0 +1,229 @@
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from data_store import SESSION_TTL_SECONDS, TAX_STORE_BACKEND, TAX_STORE_PATH, SQLiteDatabase
+
+# Largest single PDF accepted by /upload
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+
+UPLOAD_CHUNK_SIZE = 256 * 1024
+# Uploaded files bigger than this are spooled to a temporary file while the request is parsed
+UPLOAD_SPOOL_BYTES = 512 * 1024
+
+# Uploaded files older than this are removed by the background collector, unless their session is still
+# active; defaults to the session TTL
+UPLOAD_MAX_AGE_SECONDS = int(os.environ.get("UPLOAD_MAX_AGE_SECONDS", SESSION_TTL_SECONDS))
+# How often the collector looks for old uploads
+UPLOAD_GC_INTERVAL = int(os.environ.get("UPLOAD_GC_INTERVAL", 300))
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class CappedUploadFile(tempfile.SpooledTemporaryFile):
+    """Spool for one uploaded file that stops storing it once it passes max_bytes and flags it instead.
+
+    Used as werkzeug's file stream, so an oversized PDF isn't kept in memory or on disk while the
+    rest of the request is parsed; receive_upload then rejects it.
+    """
+
+    def __init__(self, max_bytes: int = MAX_UPLOAD_BYTES):
+        super().__init__(max_size=UPLOAD_SPOOL_BYTES, mode='rb+')
+        self.max_bytes = max_bytes
+        self.received = 0
+        self.too_large = False
+
+    def write(self, data) -> int:
+        self.received += len(data)
+        if not self.too_large and self.received > self.max_bytes:
+            self.too_large = True
+            self.seek(0)
+            self.truncate(0)
+        if self.too_large:
+            return len(data)
+        return super().write(data)
+
+
+def receive_upload(stream: BinaryIO, filepath: str, max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[int, str]:
+    """Copy an upload to filepath in chunks, hashing as it goes; returns its size and SHA-256.
+
+    The file only appears under its final name once it has been fully received.
+    """
+    if getattr(stream, 'too_large', False):
+        raise UploadTooLarge(f"File exceeds the {stream.max_bytes} byte upload limit")
+    digest = hashlib.sha256()
+    size = 0
+    partial_path = filepath + ".part"
+    try:
+        with open(partial_path, 'wb') as f:
+            for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b''):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"File exceeds the {max_bytes} byte upload limit")
+                digest.update(chunk)
+                f.write(chunk)
+        os.replace(partial_path, filepath)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return size, digest.hexdigest()
+
+
+@dataclass(frozen=True)
+class UploadRecord:
+    name: str
+    size: int
+    upload_time: float
+    file_hash: str
+
+    def to_dict(self):
+        return {'name': self.name, 'size': self.size, 'upload_time': self.upload_time}
+
+
+class UploadIndex:
+    """In-process index of each session's uploaded files, so listing them needs no directory scan."""
+
+    def __init__(self):
+        self._sessions: Dict[str, Dict[str, UploadRecord]] = {}
+        self._lock = threading.Lock()
+
+    def contains(self, session_id: str, name: str) -> bool:
+        with self._lock:
+            return name in self._sessions.get(session_id, {})
+
+    def add(self, session_id: str, name: str, size: int, file_hash: str) -> UploadRecord:
+        record = UploadRecord(name=name, size=size, upload_time=time.time(), file_hash=file_hash)
+        with self._lock:
+            self._sessions.setdefault(session_id, {})[name] = record
+        return record
+
+    def remove(self, session_id: str, name: str):
+        with self._lock:
+            self._sessions.get(session_id, {}).pop(name, None)
+
+    def list(self, session_id: str) -> List[UploadRecord]:
+        # Upload order; dicts keep insertion order
+        with self._lock:
+            return list(self._sessions.get(session_id, {}).values())
+
+    def discard_session(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SQLiteUploadIndex(SQLiteDatabase):
+    """Index of each session's uploaded files in the shared SQLite store, seen by every worker process."""
+
+    def __init__(self, path: str = TAX_STORE_PATH):
+        super().__init__(path, """
+            CREATE TABLE IF NOT EXISTS uploads (
+                session_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                upload_time REAL NOT NULL,
+                file_hash TEXT NOT NULL,
+                PRIMARY KEY (session_id, name)
+            );
+        """)
+
+    def contains(self, session_id: str, name: str) -> bool:
+        return self._connection().execute(
+            "SELECT 1 FROM uploads WHERE session_id = ? AND name = ?", (session_id, name)
+        ).fetchone() is not None
+
+    def add(self, session_id: str, name: str, size: int, file_hash: str) -> UploadRecord:
+        record = UploadRecord(name=name, size=size, upload_time=time.time(), file_hash=file_hash)
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO uploads (session_id, name, size, upload_time, file_hash) VALUES (?, ?, ?, ?, ?)",
+                (session_id, record.name, record.size, record.upload_time, record.file_hash)
+            )
+        return record
+
+    def remove(self, session_id: str, name: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM uploads WHERE session_id = ? AND name = ?", (session_id, name))
+
+    def list(self, session_id: str) -> List[UploadRecord]:
+        return [UploadRecord(*row) for row in self._connection().execute(
+            "SELECT name, size, upload_time, file_hash FROM uploads WHERE session_id = ? ORDER BY upload_time",
+            (session_id,)
+        )]
+
+    def discard_session(self, session_id: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM uploads WHERE session_id = ?", (session_id,))
+
+
+def create_upload_index(backend: str = TAX_STORE_BACKEND):
+    # The file list is shared between worker processes whenever the session data is
+    return SQLiteUploadIndex() if backend == 'sqlite' else UploadIndex()
+
+
+# Shared index used by the Flask app
+upload_index = create_upload_index()
+
+
+def collect_old_uploads(folder: str, max_age: float = UPLOAD_MAX_AGE_SECONDS,
+                        on_remove: Optional[Callable[[str, str], None]] = None,
+                        is_active: Optional[Callable[[str], bool]] = None) -> int:
+    """Remove files under folder/<session>/ older than max_age, and session folders left empty.
+
+    Folders of sessions for which is_active(session_id) is true are left alone: their files are still
+    counted in the session's totals, and go when the session expires. on_remove(session_id, name) is
+    called for every removed file; returns the number of files removed.
+    """
+    cutoff = time.time() - max_age
+    removed = 0
+    try:
+        sessions = list(os.scandir(folder))
+    except FileNotFoundError:
+        return 0
+    for session_dir in sessions:
+        if not session_dir.is_dir(follow_symlinks=False):
+            continue
+        if is_active is not None and is_active(session_dir.name):
+            continue
+        remaining = 0
+        for entry in os.scandir(session_dir.path):
+            try:
+                if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+                    if on_remove is not None:
+                        on_remove(session_dir.name, entry.name)
+                    continue
+            except FileNotFoundError:
+                # Removed concurrently, e.g. by /clear-uploads
+                continue
+            remaining += 1
+        if not remaining:
+            try:
+                os.rmdir(session_dir.path)
+            except OSError:
+                # A new upload arrived in the meantime
+                pass
+    return removed
+
+
+def start_upload_gc(folder: str, interval: float = UPLOAD_GC_INTERVAL, max_age: float = UPLOAD_MAX_AGE_SECONDS,
+                    index=upload_index, is_active: Optional[Callable[[str], bool]] = None) -> threading.Thread:
+    """Collect old uploads of inactive sessions every interval seconds on a daemon thread, keeping index in step."""
+    def run():
+        while True:
+            try:
+                collect_old_uploads(folder, max_age, index.remove, is_active)
+            except Exception as e:
+                print(f"Upload cleanup failed: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="upload-gc", daemon=True)
+    thread.start()
+    return thread
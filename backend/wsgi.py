@@ -0,0 +1,17 @@
+"""Production entry point.
+
+Run from the backend directory:
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from main import app, upload_jobs
+from ocr_engine import ocr_engine
+from bulk_forms import bulk_renderer
+from metrics import registry
+
+
+def drain():
+    """Finish every queued and running upload job, stop the OCR and bulk form process pools and publish the final metrics."""
+    upload_jobs.shutdown(wait=True)
+    ocr_engine.shutdown(wait=True)
+    bulk_renderer.shutdown(wait=True)
+    registry.flush()
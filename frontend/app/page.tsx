@@ -13,9 +13,19 @@ type UploadedFile = {
   name: string;
   size: number;
   upload_time: number;
+  original_name?: string;
   status?: string;
   message?: string;
   error?: string;
+  job_id?: string;
+};
+
+type UploadJob = {
+  job_id: string;
+  filename: string;
+  status: 'queued' | 'running' | 'done' | 'failed' | 'cancelled';
+  result: { type: string; error?: string } | null;
+  error: string | null;
 };
 
 type TaxResults = {
@@ -25,6 +35,7 @@ type TaxResults = {
   refund_or_due: number;
   credits_applied: number;
   form_generated: boolean;
+  form_url?: string | null;
   breakdown: {
     wages: number;
     nec_income: number;
@@ -32,6 +43,16 @@ type TaxResults = {
   };
 };
 
+// Each browser tab gets its own backend session so concurrent users don't share a return
+const getSessionId = () => {
+  let sessionId = sessionStorage.getItem('taxSessionId');
+  if (!sessionId) {
+    sessionId = crypto.randomUUID();
+    sessionStorage.setItem('taxSessionId', sessionId);
+  }
+  return sessionId;
+};
+
 export default function TaxReturnUpload() {
   const [files, setFiles] = useState<File[]>([]);
   const [uploadStatus, setUploadStatus] = useState('');
@@ -49,6 +70,12 @@ export default function TaxReturnUpload() {
   const [formPreviewUrl, setFormPreviewUrl] = useState('');
   const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || 'http://localhost:5000';
 
+  const apiFetch = (path: string, init: RequestInit = {}) =>
+    fetch(`${API_BASE_URL}${path}`, {
+      ...init,
+      headers: { ...init.headers, 'X-Session-ID': getSessionId() }
+    });
+
   // Reset state on page refresh
   useEffect(() => {
     // Reset frontend state
@@ -59,7 +86,7 @@ export default function TaxReturnUpload() {
     // Clear backend uploads folder and reset data store
     const resetEverything = async () => {
       try {
-        await fetch(`${API_BASE_URL}/clear-uploads`, {
+        await apiFetch(`/clear-uploads`, {
           method: 'POST'
         });
       } catch (error) {
@@ -113,7 +140,7 @@ export default function TaxReturnUpload() {
       setUploadStatus('Uploading files and submitting personal information...');
       
       // First submit personal info
-      const personalInfoResponse = await fetch(`${API_BASE_URL}/submit-personal-info`, {
+      const personalInfoResponse = await apiFetch(`/submit-personal-info`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -133,7 +160,7 @@ export default function TaxReturnUpload() {
       const formData = new FormData();
       files.forEach(file => formData.append('files', file));
 
-      const filesResponse = await fetch(`${API_BASE_URL}/upload`, {
+      const filesResponse = await apiFetch(`/upload`, {
         method: 'POST',
         body: formData,
       });
@@ -144,9 +171,19 @@ export default function TaxReturnUpload() {
 
       const data = await filesResponse.json();
       
+      // Wait for the queued files to finish processing in the background
+      setUploadStatus('Processing documents...');
+      const queuedFiles = data.files.filter((file: UploadedFile) => file.status === 'queued');
+      const jobs = await Promise.all(queuedFiles.map((file: UploadedFile) => waitForJob(file.job_id as string)));
+      const jobFiles = jobs.map(job => ({
+        ...(job.result ?? {}),
+        status: job.status === 'done' ? 'processed' : job.status,
+        error: job.error || job.result?.error
+      }));
+
       // Check for skipped files
       const skippedFiles = data.files.filter((file: UploadedFile) => file.status === 'skipped');
-      const processedFiles = data.files.filter((file: UploadedFile) => file.status === 'processed');
+      const processedFiles = jobFiles.filter(file => file.status === 'processed');
       
       let statusMessage = '';
       if (processedFiles.length > 0) {
@@ -156,9 +193,10 @@ export default function TaxReturnUpload() {
         statusMessage += `${skippedFiles.length} file(s) skipped (already uploaded).`;
       }
       
-      const errorFiles = data.files.filter((file: UploadedFile) => file.error);
+      const rejectedFiles = data.files.filter((file: UploadedFile) => file.status === 'rejected');
+      const errorFiles = [...jobFiles.filter(file => file.error), ...rejectedFiles.map((file: UploadedFile) => ({ error: `${file.original_name}: ${file.message}` }))];
       if (errorFiles.length > 0) {
-        const errorMessages = errorFiles.map((file: UploadedFile) => file.error).join('\n');
+        const errorMessages = errorFiles.map(file => file.error).join('\n');
         statusMessage += ` Errors: ${errorMessages}`;
       }
       
@@ -172,9 +210,22 @@ export default function TaxReturnUpload() {
     }
   };
 
+  const waitForJob = async (jobId: string): Promise<UploadJob> => {
+    // Poll the backend until the upload job has finished
+    while (true) {
+      const response = await apiFetch(`/jobs/${jobId}`);
+      if (!response.ok) throw new Error('Failed to fetch upload status');
+      const job: UploadJob = await response.json();
+      if (job.status !== 'queued' && job.status !== 'running') {
+        return job;
+      }
+      await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+  };
+
   const handleCalculateTax = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/calculate-tax`);
+      const response = await apiFetch(`/calculate-tax`);
       if (!response.ok) {
         throw new Error('Failed to calculate tax');
       }
@@ -190,7 +241,7 @@ export default function TaxReturnUpload() {
       setUploadStatus('Resetting uploads and data...');
       
       // Clear uploads and reset data store
-      const response = await fetch(`${API_BASE_URL}/clear-uploads`, {
+      const response = await apiFetch(`/clear-uploads`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -211,7 +262,7 @@ export default function TaxReturnUpload() {
 
   const fetchUploadedFiles = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/get-uploaded-files`);
+      const response = await apiFetch(`/get-uploaded-files`);
       if (!response.ok) throw new Error('Failed to fetch uploaded files');
       const data = await response.json();
       if (data.success) {
@@ -225,7 +276,7 @@ export default function TaxReturnUpload() {
   const handlePreviewForm = async () => {
     try {
       // Fetch the filled form PDF
-      const response = await fetch(`${API_BASE_URL}/outputs/filled_1040.pdf`);
+      const response = await apiFetch(taxResults?.form_url || `/outputs/filled_1040.pdf`);
       if (!response.ok) throw new Error('Failed to fetch form');
       
       const blob = await response.blob();
@@ -240,7 +291,7 @@ export default function TaxReturnUpload() {
   const handleDownloadForm = async () => {
     try {
       // Fetch the filled form PDF
-      const response = await fetch(`${API_BASE_URL}/outputs/filled_1040.pdf`);
+      const response = await apiFetch(taxResults?.form_url || `/outputs/filled_1040.pdf`);
       if (!response.ok) throw new Error('Failed to fetch form');
       
       const blob = await response.blob();